@@ -0,0 +1,473 @@
+# the computer player
+#
+# nothing here uses pygame, so the AI can play without a window
+# (see tic_tac_toe_simulate.py)
+
+import random
+import threading
+import time
+from tic_tac_toe_engine import get_shared_table, iter_moves
+from tic_tac_toe_book import get_book
+from tic_tac_toe_strategies import get_strategy
+
+# minimax scores for winning and losing
+# the sooner the win the higher the score, so the AI doesn't drag the game out
+win_score = 1000000000
+win_threshold = win_score - 1000
+infinity = win_score + 1
+
+# how a transposition table entry's score relates to the real score
+exact = 0
+lower_bound = 1
+upper_bound = 2
+
+def score_to_table(score, ply):
+
+    # wins and losses are stored as moves from the position, not from the root
+    # so the entry is right wherever the position turns up in the tree
+    if score > win_threshold:
+        return score + ply
+    elif score < -win_threshold:
+        return score - ply
+    else:
+        return score
+
+def score_from_table(score, ply):
+
+    if score > win_threshold:
+        return score - ply
+    elif score < -win_threshold:
+        return score + ply
+    else:
+        return score
+
+def evaluate_lines(geometry, ai_bits, player_bits):
+
+    # score a position when the search stops before the end of the game
+    # every winning line that only one player has marks in is worth more
+    # the more marks it has (for the AI if they're the AI's, against it if not)
+    score = 0
+    for line in geometry.win_lines:
+        ai_marks = ai_bits & line
+        player_marks = player_bits & line
+        if ai_marks and not player_marks:
+            score += 4 ** ai_marks.bit_count()
+        elif player_marks and not ai_marks:
+            score -= 4 ** player_marks.bit_count()
+    return score
+
+class SearchTimeout(Exception):
+    pass
+
+class AI:
+
+    def __init__(self, mark, strategy, table=None, book=None, time_limit=None, max_depth=None, evaluate=evaluate_lines,
+                 rng=None, stats=None, index=None, playouts=None, workers=1):
+        self.mark = mark
+
+        # the name of a strategy in tic_tac_toe_strategies.py (raises ValueError if there isn't one)
+        self.strategy = strategy
+
+        # where random moves come from
+        # give each AI its own random.Random(seed) to replay the same games
+        if rng is None:
+            rng = random
+        self.rng = rng
+
+        # seconds the AI may think about a move
+        # or None for the smart AI to always search to the end of the game
+        self.time_limit = time_limit
+        self.deadline = None
+
+        # how many moves ahead the smart AI looks (None for all of them)
+        # and how it scores a position where it stopped looking
+        # evaluate(geometry, ai_bits, player_bits) returns a score for the AI
+        # that stays well below win_score
+        self.max_depth = max_depth
+        self.evaluate = evaluate
+        self.geometry = None
+        self.killer_moves = []
+
+        # what the last search did, readable from another thread while it runs
+        # nodes searched, the depth being searched, and each depth that was searched
+        self.nodes = 0
+        self.depth = 0
+        self.iterations = []
+        self.search_start = 0
+        self.source = None
+
+        # a SearchStats to record every move in, or None to not record anything
+        self.stats = stats
+
+        # set by stop() from another thread to end a search early
+        self.stop_requested = False
+
+        # the opening book answers smart moves without searching
+        # it's None if the book hasn't been built
+        if book is None:
+            book = get_book()
+        elif book is False:
+            book = None
+        self.book = book
+
+        # without a book the position index answers 3x3 smart moves
+        # it's loaded (or built) the first time it's needed, bigger boards are searched
+        # (pass book=False and index=False to always search)
+        self.index = index
+
+        # remember the scores of searched positions
+        # all AIs share one table for each board size unless they're given their own
+        # (a table of your own should only be used for one board size)
+        self.own_table = table
+        self.table = table
+
+        # the 'mcts' strategy plays random games instead of searching
+        # it thinks for time_limit seconds or for this many playouts (see tic_tac_toe_mcts.py)
+        # and keeps its tree from one move to the next
+        self.playouts = playouts
+
+        # processes to search or play random games in
+        # (the smart AI's search is split over them, see tic_tac_toe_parallel.py)
+        self.workers = workers
+
+        # what chooses the moves
+        self.engine = get_strategy(strategy)(self)
+
+    def get_available_moves(self, board):
+
+        # yield the (row, col) of every empty square on the board
+        # straight from the bitboard, without building a list
+        return board.geometry.iter_squares(board.state.get_empty())
+
+    def move(self, board):
+
+        # choose a square then mark it on the board
+        index = self.choose_move(board.state)
+
+        # return None if there are no available moves left
+        if index is None:
+            return None
+
+        row, col = board.geometry.square_position(index)
+        return board.mark_square(row, col, self.mark)
+
+    def choose_move(self, state):
+
+        # return the index of the square to play in a GameState, without changing it
+        # it's safe to run in a background thread on a copy of the board's state
+        if self.stats is None:
+            return self.select_move(state)
+
+        # time the move and record what the search did
+        start_time = time.perf_counter()
+        self.nodes = 0
+        self.depth = 0
+        self.iterations = []
+        self.source = None
+        table = self.engine.get_cache(state.geometry)
+        if table is not None:
+            hits = table.hits
+            misses = table.misses
+
+        index = self.select_move(state)
+
+        seconds = time.perf_counter() - start_time
+        if table is not None:
+            hits = table.hits - hits
+            misses = table.misses - misses
+            table_size = len(table)
+        else:
+            hits = misses = table_size = 0
+        depth = 0
+        for iteration in self.iterations:
+            if iteration['completed']:
+                depth = iteration['depth']
+
+        self.stats.record({
+            'mark': self.mark,
+            'strategy': self.strategy,
+            'move': index,
+            'source': self.source,
+            'thread': threading.get_ident(),
+            'start': start_time,
+            'seconds': seconds,
+            'nodes': self.nodes,
+            'nodes_per_sec': self.nodes / seconds if seconds else 0,
+            'depth': depth,
+            'timed_out': any(not iteration['completed'] for iteration in self.iterations),
+
+            # how many moves are searched at each depth, if every node had the same number
+            'branching_factor': self.nodes ** (1 / depth) if depth else 0,
+            'table_hits': hits,
+            'table_misses': misses,
+            'table_hit_rate': hits / (hits + misses) if hits + misses else 0,
+            'table_size': table_size,
+            'iterations': self.iterations,
+        })
+        return index
+
+    def select_move(self, state):
+
+        # where the move came from: 'random', 'book', 'index', 'search' or 'mcts'
+        self.source = None
+        self.stop_requested = False
+
+        # the board size to search on
+        self.geometry = state.geometry
+        if self.own_table is None:
+            self.table = self.shared_table(self.geometry)
+
+        # return None if there are no available moves left
+        if state.get_empty() == 0:
+            return None
+
+        # let the strategy choose
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.perf_counter() + self.time_limit
+        return self.engine.choose_move(state, deadline)
+
+    def shared_table(self, geometry):
+
+        # the table this AI shares with every other AI that scores positions the same way
+        if self.evaluate is evaluate_lines:
+            return get_shared_table(geometry)
+        return get_shared_table(geometry, self.evaluate)
+
+    def find_best_move(self, ai_bits, player_bits, deadline=None):
+
+        # the best move for the AI, searching until deadline (a time.perf_counter() time)
+        # or to the end of the game if there isn't one
+
+        empty = self.geometry.full_board & ~(ai_bits | player_bits)
+        max_depth = empty.bit_count()
+        if self.max_depth is not None:
+            max_depth = min(max_depth, self.max_depth)
+
+        # moves that caused a cutoff, for each ply
+        self.killer_moves = [[] for i in range(max_depth + 1)]
+        self.nodes = 0
+        self.iterations = []
+        self.search_start = time.perf_counter()
+
+        # the move to make if the search is stopped before it finishes anything
+        best_move = self.order_moves(self.geometry.candidate_moves(ai_bits | player_bits), 0, None)[0]
+
+        # without a deadline, search all the way to the end of the game
+        if deadline is None:
+            self.deadline = None
+            try:
+                best_move, best_score = self.search_to_depth(ai_bits, player_bits, max_depth)
+            except SearchTimeout:
+                pass
+            return best_move
+
+        # iterative deepening: search 1 move ahead, then 2, ... until time runs out
+        # and use the best move of the deepest search that finished
+        self.deadline = deadline
+        for depth in range(1, max_depth + 1):
+            try:
+                best_move, best_score = self.search_to_depth(ai_bits, player_bits, depth)
+            except SearchTimeout:
+                break
+
+            # a deeper search can't find a faster win or avoid a forced loss
+            # (the table can know about wins further away than this depth, keep going for those)
+            if abs(best_score) > win_threshold and win_score - abs(best_score) <= depth:
+                break
+
+        self.deadline = None
+        return best_move
+
+    def search_to_depth(self, ai_bits, player_bits, depth):
+
+        # search_root, remembering how long it took and how many nodes it searched
+        self.depth = depth
+        start_time = time.perf_counter()
+        start_nodes = self.nodes
+        iteration = {'depth': depth, 'start': start_time - self.search_start, 'completed': False, 'move': None,
+                     'score': None}
+        self.iterations.append(iteration)
+        try:
+            if self.workers > 1:
+                from tic_tac_toe_parallel import parallel_search_root
+                best_move, best_score = parallel_search_root(self, ai_bits, player_bits, depth)
+            else:
+                best_move, best_score = self.search_root(ai_bits, player_bits, depth)
+            iteration.update(completed=True, move=best_move, score=best_score)
+            return best_move, best_score
+        finally:
+            iteration['seconds'] = time.perf_counter() - start_time
+            iteration['nodes'] = self.nodes - start_nodes
+
+    def stop(self):
+
+        # end the current search as soon as possible (from another thread)
+        # the AI then plays the best move it has found so far
+        self.stop_requested = True
+        self.engine.stop()
+
+    def is_out_of_time(self):
+        if self.stop_requested:
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def search_root(self, ai_bits, player_bits, depth):
+
+        moves = self.geometry.candidate_moves(ai_bits | player_bits)
+
+        # score every possible move to determine the best move
+        best_score = None
+        best_move = None
+
+        # look at every available move
+        for index in self.order_moves(moves, 0, None):
+
+            # only moves at least as good as the best one so far need an exact score
+            # (moves with the same score are needed to pick the first one of them)
+            if best_score is None:
+                alpha = -infinity
+            else:
+                alpha = best_score - 1
+
+            # use minimax algorithm to score this move
+            score = self.minimax(ai_bits | (1 << index), player_bits, index, False, depth - 1, alpha, infinity, 1)
+
+            # check if the score is better, or as good and the square comes first
+            if best_score is None or score > best_score or (score == best_score and index < best_move):
+                best_score = score
+                best_move = index
+
+        return best_move, best_score
+
+    def order_moves(self, candidates, ply, table_move):
+
+        # center first, then the corners, then the edges
+        moves = sorted(iter_moves(candidates), key=self.geometry.move_rank.__getitem__)
+
+        # then the moves that caused cutoffs at this ply
+        for index in self.killer_moves[ply]:
+            if candidates & (1 << index):
+                moves.remove(index)
+                moves.insert(0, index)
+
+        # and the best move found by an earlier search before anything else
+        if table_move is not None and candidates & (1 << table_move):
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+
+        return moves
+
+    def add_killer_move(self, ply, index):
+
+        # keep the last 2 moves that caused a cutoff at this ply
+        killers = self.killer_moves[ply]
+        if index not in killers:
+            killers.insert(0, index)
+            del killers[2:]
+
+    def minimax(self, ai_bits, player_bits, last_move, is_maximizing, depth, alpha, beta, ply):
+
+        geometry = self.geometry
+
+        # stop if the AI ran out of time
+        self.nodes += 1
+        if self.nodes % 256 == 0 and self.is_out_of_time():
+            raise SearchTimeout()
+
+        # only the player who made the last move can have won
+        # a win sooner is worth more than a win later, and a loss later costs less
+        if is_maximizing:
+
+            # return a negative minimax score if the move resulted in the human player winning
+            if geometry.is_winning_move(player_bits, last_move):
+                return ply - win_score
+
+        else:
+
+            # return a positive minimax score if the move resulted in the AI winning
+            if geometry.is_winning_move(ai_bits, last_move):
+                return win_score - ply
+
+        # return a minimax score of 0 if the move resulted in a tie
+        occupied = ai_bits | player_bits
+        empty = geometry.full_board & ~occupied
+        if empty == 0:
+            return 0
+
+        # searching deeper than the end of the game doesn't change the score
+        depth = min(depth, empty.bit_count())
+
+        # out of depth, the game goes on so estimate the score
+        if depth == 0:
+            return self.evaluate(geometry, ai_bits, player_bits)
+
+        # use the score from the transposition table if this position (or a
+        # rotation or reflection of it) was searched deep enough before
+        key = (geometry.canonical_key(ai_bits, player_bits) << 1) | is_maximizing
+        entry = self.table.get(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, flag, entry_score, table_move = entry
+            if entry_depth >= depth:
+                score = score_from_table(entry_score, ply)
+                if flag == exact:
+                    return score
+                elif flag == lower_bound and score >= beta:
+                    return score
+                elif flag == upper_bound and score <= alpha:
+                    return score
+
+        original_alpha = alpha
+        original_beta = beta
+        best_move = None
+        candidates = geometry.candidate_moves(occupied)
+
+        if is_maximizing:
+
+            # what's the best score we can get after the AI makes a move
+            best_score = None
+            for index in self.order_moves(candidates, ply, table_move):
+
+                # recursively call minimax to score player's next move
+                score = self.minimax(ai_bits | (1 << index), player_bits, index, False, depth - 1, alpha, beta, ply + 1)
+
+                if best_score is None or score > best_score:
+                    best_score = score
+                    best_move = index
+
+                # stop when the human player has a better move earlier in the tree
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    self.add_killer_move(ply, index)
+                    break
+
+        else:
+
+            # what's the worst score we can get after the human player makes a move
+            best_score = None
+            for index in self.order_moves(candidates, ply, table_move):
+
+                # recursively call minimax to score AI's next move
+                score = self.minimax(ai_bits, player_bits | (1 << index), index, True, depth - 1, alpha, beta, ply + 1)
+
+                if best_score is None or score < best_score:
+                    best_score = score
+                    best_move = index
+
+                # stop when the AI has a better move earlier in the tree
+                beta = min(beta, score)
+                if alpha >= beta:
+                    self.add_killer_move(ply, index)
+                    break
+
+        # a score outside the alpha-beta window is only a bound
+        if best_score <= original_alpha:
+            flag = upper_bound
+        elif best_score >= original_beta:
+            flag = lower_bound
+        else:
+            flag = exact
+        self.table.put(key, (depth, flag, score_to_table(best_score, ply), best_move))
+
+        return best_score
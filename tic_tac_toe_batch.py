@@ -0,0 +1,181 @@
+# check lots of 3x3 positions at once with numpy
+#
+# a batch of positions is an (N, 9) int8 array, one row per board
+# each square is empty_square, x_square or o_square, in the same
+# row by row order as the engine's square indexes
+#
+#   python tic_tac_toe_batch.py
+#
+# compares the speed with checking the positions one at a time
+
+import sys
+import time
+import numpy as np
+from tic_tac_toe_engine import GameState, standard_geometry
+
+empty_square = 0
+x_square = 1
+o_square = 2
+
+# the status of a position
+ongoing = 0
+x_wins = 1
+o_wins = 2
+tie = 3
+
+# the same 8 winning lines the engine uses, as bitmasks
+line_masks = np.array(standard_geometry.win_lines, dtype=np.uint16)
+
+# for every one of the 512 bitboards, does it have a full line
+has_line = np.array([standard_geometry.find_winning_line(bits) is not None
+                     for bits in range(standard_geometry.full_board + 1)])
+
+num_squares = standard_geometry.num_squares
+
+# the value of each bit of a bitboard, for turning bitboards into rows
+square_bits = 1 << np.arange(num_squares, dtype=np.int64)
+
+# every board is numbered in base 3 (its squares are the digits)
+# so everything about a board can be looked up in a table with 3 ** 9 rows
+powers_of_3 = 3 ** np.arange(num_squares)
+num_positions = 3 ** num_squares
+
+def make_tables():
+
+    # the squares of every numbered board
+    squares = (np.arange(num_positions)[:, None] // powers_of_3) % 3
+    x_bits = ((squares == x_square) * square_bits).sum(axis=1)
+    o_bits = ((squares == o_square) * square_bits).sum(axis=1)
+
+    status = np.full(num_positions, ongoing, dtype=np.int8)
+    status[(squares != empty_square).all(axis=1)] = tie
+    status[has_line[o_bits]] = o_wins
+    status[has_line[x_bits]] = x_wins
+
+    # the empty squares of the boards still being played
+    legal = (squares == empty_square) & (status == ongoing)[:, None]
+
+    # the nth legal square of each board, so a random move is one lookup
+    num_legal = legal.sum(axis=1)
+    nth_legal = np.full((num_positions, num_squares), -1, dtype=np.int8)
+    rows, cols = np.nonzero(legal)
+    nth = np.cumsum(legal, axis=1)[rows, cols] - 1
+    nth_legal[rows, nth] = cols
+
+    return status, legal, num_legal, nth_legal
+
+status_table, legal_table, num_legal_table, nth_legal_table = make_tables()
+
+def boards_from_bits(x_bits, o_bits):
+
+    # turn arrays of x and o bitboards into an (N, 9) batch
+    x_bits = np.asarray(x_bits, dtype=np.int64)
+    o_bits = np.asarray(o_bits, dtype=np.int64)
+    x_marks = (x_bits[:, None] & square_bits) != 0
+    o_marks = (o_bits[:, None] & square_bits) != 0
+    return (x_marks * x_square + o_marks * o_square).astype(np.int8)
+
+def boards_from_states(states):
+    return boards_from_bits([state.x_bits for state in states], [state.o_bits for state in states])
+
+def position_numbers(boards):
+
+    # the (N,) base 3 number of every board
+    boards = np.asarray(boards, dtype=np.int8)
+    numbers = np.zeros(len(boards), dtype=np.int16)
+    for index in range(num_squares):
+        numbers += boards[:, index].astype(np.int16) * np.int16(powers_of_3[index])
+    return numbers
+
+def winning_lines(boards, square):
+
+    # (N, 8) array of which lines are full of the square value
+    boards = np.asarray(boards, dtype=np.int8)
+    bits = np.zeros(len(boards), dtype=np.uint16)
+    for index in range(num_squares):
+        bits |= (boards[:, index] == square).astype(np.uint16) << np.uint16(index)
+    return (bits[:, None] & line_masks) == line_masks
+
+def board_status(boards, numbers=None):
+
+    # return an (N,) int8 array with ongoing, x_wins, o_wins or tie for each board
+    # (a board where both players have a line can't happen in a game, it's an x win here)
+    if numbers is None:
+        numbers = position_numbers(boards)
+    return status_table[numbers]
+
+def legal_moves(boards, numbers=None):
+
+    # (N, 9) bool array of the empty squares of boards that are still being played
+    if numbers is None:
+        numbers = position_numbers(boards)
+    return legal_table[numbers]
+
+def random_moves(boards, rng=None, numbers=None):
+
+    # pick a random legal square for every board at once, like AI.move with the
+    # 'random' strategy, or -1 for boards that are finished
+    if rng is None:
+        rng = np.random.default_rng()
+    if numbers is None:
+        numbers = position_numbers(boards)
+
+    # choose which of the legal squares to take, then look up where it is
+    num_legal = num_legal_table[numbers]
+    nth = (rng.random(len(numbers)) * num_legal).astype(np.intp)
+    moves = nth_legal_table.ravel()[numbers.astype(np.intp) * num_squares + nth].astype(np.intp)
+    moves[num_legal == 0] = -1
+    return moves
+
+def status_one_at_a_time(boards):
+
+    # the same answer as board_status, with one GameState per position
+    geometry = standard_geometry
+    status = []
+    for row in boards.tolist():
+        state = GameState(geometry=geometry)
+        for index, square in enumerate(row):
+            if square == x_square:
+                state.place(index, 'X')
+            elif square == o_square:
+                state.place(index, 'O')
+
+        if state.winning_line('X') is not None:
+            status.append(x_wins)
+        elif state.winning_line('O') is not None:
+            status.append(o_wins)
+        elif state.is_full():
+            status.append(tie)
+        else:
+            status.append(ongoing)
+    return np.array(status, dtype=np.int8)
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        num_boards = int(sys.argv[1])
+    else:
+        num_boards = 1000000
+
+    rng = np.random.default_rng(0)
+    boards = rng.integers(0, 3, size=(num_boards, 9), dtype=np.int8)
+
+    start_time = time.perf_counter()
+    numbers = position_numbers(boards)
+    status = board_status(boards, numbers)
+    status_seconds = time.perf_counter() - start_time
+    legal = legal_moves(boards, numbers)
+    moves = random_moves(boards, rng, numbers)
+    batch_seconds = time.perf_counter() - start_time
+
+    # looping is slow, so time a slice of the boards and scale it up
+    sample = boards[:min(num_boards, 100000)]
+    start_time = time.perf_counter()
+    sample_status = status_one_at_a_time(sample)
+    loop_seconds = (time.perf_counter() - start_time) * num_boards / len(sample)
+
+    assert (sample_status == status[:len(sample)]).all()
+    print(f'{num_boards} boards')
+    print(f'  status, one at a time: {loop_seconds:.3f} s')
+    print(f'  status, batch: {status_seconds:.3f} s ({loop_seconds / status_seconds:.0f}x faster)')
+    print(f'  status, legal moves and random moves, batch: {batch_seconds:.3f} s')
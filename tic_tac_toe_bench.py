@@ -0,0 +1,388 @@
+# benchmarks for the AI search, the win checks and the drawing
+#
+#   python tic_tac_toe_bench.py --output results.json
+#   python tic_tac_toe_bench.py --compare results.json --threshold 0.1
+#
+# every scenario reports a few metrics (nodes/sec, moves/sec, p50/p99 move
+# latency, peak memory, ...) and the results can be saved as JSON
+# comparing with an older JSON file lists the metrics that got worse by more
+# than the threshold, and exits with status 1 if there are any
+#
+# the drawing scenario uses SDL's dummy video driver, so no window shows up
+# and the other scenarios don't need pygame at all
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from tic_tac_toe_engine import GameState, TranspositionTable, get_geometry, iter_moves
+from tic_tac_toe_core import Board
+from tic_tac_toe_ai import AI
+
+# metrics where a bigger number is better (and every speedup_...)
+# for all the other metrics (times, memory) a smaller number is better
+higher_is_better = {'nodes_per_sec', 'moves_per_sec', 'checks_per_sec', 'calls_per_sec', 'frames_per_sec'}
+
+def is_higher_better(metric):
+    return metric in higher_is_better or metric.startswith('speedup_')
+
+# scenario name -> function(repeat) that returns a dict of metrics
+scenarios = dict()
+
+def scenario(function):
+    scenarios[function.__name__] = function
+    return function
+
+def percentile(values, percent):
+
+    # nearest rank percentile of a list of numbers
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, round(percent / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+def latency_metrics(latencies):
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+def peak_memory(function):
+
+    # the most memory allocated at once while function runs, in bytes
+    tracemalloc.start()
+    try:
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def time_smart_move(state, mark):
+
+    # one smart move with an empty transposition table, and no opening book or position index
+    # returns (seconds, nodes)
+    ai = AI(mark, 'smart', table=TranspositionTable(), book=False, index=False)
+    start_time = time.perf_counter()
+    ai.choose_move(state)
+    return time.perf_counter() - start_time, ai.nodes
+
+def random_game_positions(geometry, count, seed=0):
+
+    # (state, last move, mark) after every move of random games
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = GameState(geometry=geometry)
+        mark = rng.choice('XO')
+        while True:
+            index = rng.choice(list(state.available_moves()))
+            state.place(index, mark)
+            positions.append((state.copy(), index, mark))
+            if state.is_winning_move(index, mark) or state.is_full():
+                break
+            if mark == 'X':
+                mark = 'O'
+            else:
+                mark = 'X'
+    return positions[:count]
+
+def open_game_window():
+
+    # draw in a window from SDL's dummy driver, so nothing shows up on the screen
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import tic_tac_toe_part2
+    tic_tac_toe_part2.open_window()
+    return tic_tac_toe_part2
+
+def board_from_state(state):
+
+    board = Board(state.geometry.size, state.geometry.win_length)
+    for index in iter_moves(state.x_bits | state.o_bits):
+        row, col = state.geometry.square_position(index)
+        board.mark_square(row, col, state.get_mark(index))
+    return board
+
+@scenario
+def minimax_empty_board(repeat):
+
+    # the smart AI's first move on an empty board, searched from scratch
+    state = GameState()
+    latencies = []
+    nodes = 0
+    for i in range(repeat):
+        seconds, move_nodes = time_smart_move(state, 'X')
+        latencies.append(seconds)
+        nodes += move_nodes
+
+    metrics = {'nodes_per_move': nodes / repeat, 'nodes_per_sec': nodes / sum(latencies)}
+    metrics.update(latency_metrics(latencies))
+    metrics['peak_memory_bytes'] = peak_memory(lambda: time_smart_move(state, 'X'))
+    return metrics
+
+@scenario
+def minimax_every_opening(repeat):
+
+    # the smart AI's reply to every first move, searched from scratch
+    openings = []
+    for index in range(9):
+        state = GameState()
+        state.place(index, 'X')
+        openings.append(state)
+
+    latencies = []
+    nodes = 0
+    for i in range(repeat):
+        for state in openings:
+            seconds, move_nodes = time_smart_move(state, 'O')
+            latencies.append(seconds)
+            nodes += move_nodes
+
+    metrics = {'nodes_per_move': nodes / len(latencies), 'nodes_per_sec': nodes / sum(latencies),
+               'moves_per_sec': len(latencies) / sum(latencies)}
+    metrics.update(latency_metrics(latencies))
+    metrics['peak_memory_bytes'] = peak_memory(lambda: [time_smart_move(state, 'O') for state in openings])
+    return metrics
+
+@scenario
+def parallel_search(repeat):
+
+    # the smart AI's search on 4x4 (to the end of the game) with 1 to os.cpu_count() workers
+    # (at least 2, so the parallel search is always measured)
+    # 1 worker is the normal search, the speedups are against it
+    positions = [(state, 'O' if mark == 'X' else 'X')
+                 for state, index, mark in random_game_positions(get_geometry(4, 4), 200, seed=1)
+                 if (state.x_bits | state.o_bits).bit_count() == 6 and not state.is_winning_move(index, mark)][:4]
+
+    def search_all(workers):
+        for state, mark in positions:
+            ai = AI(mark, 'smart', table=TranspositionTable(), book=False, index=False, workers=workers)
+            ai.choose_move(state)
+
+    # start the worker processes before timing
+    max_workers = max(2, os.cpu_count())
+    for workers in range(2, max_workers + 1):
+        search_all(workers)
+
+    metrics = dict()
+    for workers in range(1, max_workers + 1):
+        start_time = time.perf_counter()
+        for i in range(repeat):
+            search_all(workers)
+        metrics[f'seconds_{workers}_workers'] = (time.perf_counter() - start_time) / repeat
+    for workers in range(2, max_workers + 1):
+        metrics[f'speedup_{workers}_workers'] = metrics['seconds_1_workers'] / metrics[f'seconds_{workers}_workers']
+    return metrics
+
+@scenario
+def board_win_checks(repeat):
+
+    # Board.check_winner and Board.check_tie after every move of random games
+    positions = [(board_from_state(state), index, mark)
+                 for state, index, mark in random_game_positions(get_geometry(), 2000)]
+    checks = []
+    for board, index, mark in positions:
+        row, col = board.geometry.square_position(index)
+        checks.append((board, board.squares[(row, col)], mark))
+
+    def run_checks():
+        for board, square, mark in checks:
+            board.check_winner(square, mark)
+            board.check_tie()
+
+    start_time = time.perf_counter()
+    for i in range(repeat):
+        run_checks()
+    seconds = time.perf_counter() - start_time
+
+    return {
+        'checks_per_sec': repeat * len(checks) / seconds,
+        'peak_memory_bytes': peak_memory(run_checks),
+    }
+
+@scenario
+def available_moves(repeat):
+
+    # AI.get_available_moves, and how much memory each call allocates
+    boards = [board_from_state(state) for state, index, mark in random_game_positions(get_geometry(), 2000)]
+    ai = AI('O', 'random')
+
+    start_time = time.perf_counter()
+    for i in range(repeat):
+        for board in boards:
+            for move in ai.get_available_moves(board):
+                pass
+    seconds = time.perf_counter() - start_time
+
+    # keep every result alive so the memory they use can be counted
+    tracemalloc.start()
+    try:
+        before, peak = tracemalloc.get_traced_memory()
+        results = [list(ai.get_available_moves(board)) for board in boards]
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls_per_sec': repeat * len(boards) / seconds,
+        'bytes_per_call': (after - before) / len(results),
+    }
+
+@scenario
+def board_draw(repeat):
+
+    # Board.draw frame times: redrawing everything, one changed square, nothing changed
+    game = open_game_window()
+    board = game.Board()
+    for index in (0, 4, 8, 2):
+        row, col = board.geometry.square_position(index)
+        board.mark_square(row, col, 'XO'[index % 2])
+
+    full_times = []
+    changed_times = []
+    idle_times = []
+    for i in range(repeat * 20):
+
+        board.redraw_all = True
+        start_time = time.perf_counter()
+        board.draw()
+        full_times.append(time.perf_counter() - start_time)
+
+        board.changed |= 1
+        start_time = time.perf_counter()
+        board.draw()
+        changed_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        board.draw()
+        idle_times.append(time.perf_counter() - start_time)
+
+    def full_redraw():
+        board.redraw_all = True
+        board.draw()
+
+    return {
+        'full_p50_ms': percentile(full_times, 50) * 1000,
+        'full_p99_ms': percentile(full_times, 99) * 1000,
+        'changed_p50_ms': percentile(changed_times, 50) * 1000,
+        'changed_p99_ms': percentile(changed_times, 99) * 1000,
+        'idle_p50_ms': percentile(idle_times, 50) * 1000,
+        'frames_per_sec': len(full_times) / sum(full_times),
+        'peak_memory_bytes': peak_memory(full_redraw),
+    }
+
+@scenario
+def board_memory(repeat):
+
+    # bytes each Board and GameState takes, with a few marks on it
+    # (what a server or a replay holding lots of boards pays for each one)
+    count = 10000
+    moves = [(0, 0, 'X'), (1, 1, 'O'), (2, 2, 'X'), (0, 2, 'O')]
+
+    def make_boards():
+        boards = []
+        for i in range(count):
+            board = Board()
+            for row, col, mark in moves:
+                board.mark_square(row, col, mark)
+            boards.append(board)
+        return boards
+
+    def make_states():
+        return [GameState(1 << (i % 9), 0) for i in range(count)]
+
+    results = dict()
+    for name, make in (('bytes_per_board', make_boards), ('bytes_per_state', make_states)):
+        tracemalloc.start()
+        try:
+            before, peak = tracemalloc.get_traced_memory()
+            objects = make()
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results[name] = (after - before) / len(objects)
+    return results
+
+def run_benchmarks(names, repeat):
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'scenarios': dict(),
+    }
+    for name in names:
+        results['scenarios'][name] = scenarios[name](repeat)
+    return results
+
+def compare_results(old_results, new_results, threshold):
+
+    # return a list of (scenario, metric, old value, new value) that got worse by more than threshold
+    regressions = []
+    for name, new_metrics in new_results['scenarios'].items():
+        old_metrics = old_results['scenarios'].get(name, dict())
+        for metric, new_value in new_metrics.items():
+            old_value = old_metrics.get(metric)
+            if not old_value:
+                continue
+            if is_higher_better(metric):
+                worse = new_value < old_value * (1 - threshold)
+            else:
+                worse = new_value > old_value * (1 + threshold)
+            if worse:
+                regressions.append((name, metric, old_value, new_value))
+    return regressions
+
+def print_results(results, old_results=None):
+
+    for name, metrics in results['scenarios'].items():
+        print(name)
+        for metric, value in metrics.items():
+            line = f'  {metric:<20} {value:>14.4g}'
+            if old_results is not None and old_results['scenarios'].get(name, dict()).get(metric):
+                old_value = old_results['scenarios'][name][metric]
+                line += f'  ({(value - old_value) / old_value:+.1%})'
+            print(line)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the AI search, the win checks and the drawing.')
+    parser.add_argument('scenarios', nargs='*', help=f"scenarios to run (default all: {', '.join(scenarios)})")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='fraction a metric can get worse by')
+    args = parser.parse_args()
+
+    names = args.scenarios or list(scenarios)
+    for name in names:
+        if name not in scenarios:
+            parser.error(f'unknown scenario {name}')
+
+    results = run_benchmarks(names, args.repeat)
+
+    old_results = None
+    if args.compare:
+        with open(args.compare) as results_file:
+            old_results = json.load(results_file)
+
+    print_results(results, old_results)
+
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    if old_results is not None:
+        regressions = compare_results(old_results, results, args.threshold)
+        for name, metric, old_value, new_value in regressions:
+            print(f'regression: {name} {metric} {old_value:.4g} -> {new_value:.4g}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# opening book for the smart AI
+#
+# `python tic_tac_toe_book.py` takes the best move and outcome of every position
+# from the position index (tic_tac_toe_index.py) and writes them to a small binary file
+# the game memory-maps the file at startup so a smart move is one lookup
+#
+# file layout (little endian):
+#   magic      4 bytes   b'TTTB'
+#   version    2 bytes
+#   board size 2 bytes
+#   entries    4 bytes   number of positions in the table (3 ** 9)
+#   checksum   4 bytes   crc32 of the table
+#   table      1 byte per position
+#
+# a position is numbered in base 3 from the player to move's point of view
+# (digit 1 = the player to move's mark, digit 2 = the other mark)
+# each byte holds the best move in the low 4 bits and the outcome + 1 in the
+# high 4 bits (outcome is 1 win, 0 tie, -1 loss with best play), or no_entry
+# for positions that aren't in the book
+
+import mmap
+import os
+import struct
+import sys
+import zlib
+from tic_tac_toe_engine import standard_geometry
+from tic_tac_toe_index import build_index, position_number
+
+# the book is only for the normal 3x3 game
+board_size = standard_geometry.size
+num_squares = standard_geometry.num_squares
+
+magic = b'TTTB'
+version = 2
+header = struct.Struct('<4sHHII')
+num_entries = 3 ** num_squares
+no_entry = 0xFF
+
+default_book_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tic_tac_toe_book.bin')
+
+def build_table():
+
+    # the book move of a position is the lowest of its best moves in the position index
+    index = build_index()
+    table = bytearray([no_entry]) * num_entries
+    for number in range(num_entries):
+        best_moves = index.best_moves[number]
+        if best_moves:
+            best_move = (best_moves & -best_moves).bit_length() - 1
+            table[number] = ((index.outcomes[number] + 1) << 4) | best_move
+    return table
+
+def write_book(path=default_book_path):
+
+    table = build_table()
+    with open(path, 'wb') as book_file:
+        book_file.write(header.pack(magic, version, board_size, num_entries, zlib.crc32(table)))
+        book_file.write(table)
+    return path
+
+class OpeningBook:
+
+    def __init__(self, data):
+
+        # data is the whole file (usually a read-only mmap)
+        self.data = data
+        self.geometry = standard_geometry
+
+    def lookup(self, mover_bits, other_bits):
+
+        # return a (best move, outcome) tuple or None if the position isn't in the book
+        entry = self.data[header.size + position_number(mover_bits, other_bits)]
+        if entry == no_entry:
+            return None
+        return entry & 0x0F, (entry >> 4) - 1
+
+def load_book(path=default_book_path):
+
+    # return an OpeningBook, or None if the file is missing, out of date or corrupt
+    # so the AI falls back to searching
+    try:
+        with open(path, 'rb') as book_file:
+            data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(data) < header.size:
+        return None
+    file_magic, file_version, file_board_size, file_entries, checksum = header.unpack_from(data)
+    if (file_magic != magic or file_version != version or file_board_size != board_size
+            or file_entries != num_entries or len(data) != header.size + num_entries):
+        return None
+    if zlib.crc32(data[header.size:]) != checksum:
+        return None
+
+    return OpeningBook(data)
+
+# the book is loaded once and shared by every AI
+loaded_books = dict()
+
+def get_book(path=default_book_path):
+    if path not in loaded_books:
+        loaded_books[path] = load_book(path)
+    return loaded_books[path]
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        path = write_book(sys.argv[1])
+    else:
+        path = write_book()
+    print(f'wrote {path}')
@@ -0,0 +1,140 @@
+# play on a tic tac toe server in a window
+#
+#   python tic_tac_toe_client.py --host 127.0.0.1 --port 8765
+#   python tic_tac_toe_client.py --opponent smart --size 7 --win-length 5
+#
+# the server runs the game, the client only draws the board and sends clicks
+# (see tic_tac_toe_server.py for the messages)
+
+import argparse
+import asyncio
+import pygame
+from pygame.locals import *
+from tic_tac_toe_part2 import Board, frame_rate, open_window
+
+async def read_messages(reader, messages):
+
+    # put every message from the server in the queue, then None when it disconnects
+    while True:
+        line = await reader.readline()
+        if not line:
+            await messages.put(None)
+            return
+        await messages.put(line.decode('ascii').split())
+
+async def run_client(host='127.0.0.1', port=8765, opponent='human', size=3, win_length=3):
+
+    reader, writer = await asyncio.open_connection(host, port)
+    messages = asyncio.Queue()
+    reader_task = asyncio.create_task(read_messages(reader, messages))
+
+    def send(message):
+        writer.write(message.encode('ascii') + b'\n')
+
+    board = Board(size, win_length)
+    open_window(board.window_size)
+    send(f'PLAY {opponent} {size} {win_length}')
+
+    mark = None
+    my_turn = False
+    game_over = False
+    caption = 'Tic Tac Toe - Connecting'
+    last_square = None
+
+    try:
+        while True:
+
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    send('QUIT')
+                    return
+
+                if event.type == MOUSEBUTTONDOWN:
+
+                    # click when the game's over to play again
+                    if game_over:
+                        send(f'PLAY {opponent} {size} {win_length}')
+                        game_over = False
+
+                    # send the clicked square, the server marks it
+                    elif my_turn:
+                        square = board.square_at(event.pos)
+                        if square is not None and square.mark is None:
+                            send(f'MOVE {square.row} {square.col}')
+                            my_turn = False
+
+            # everything the server said since the last frame
+            while not messages.empty():
+                words = messages.get_nowait()
+
+                if words is None:
+                    caption = 'Tic Tac Toe - Disconnected'
+                    game_over = False
+                    my_turn = False
+
+                elif words[0] == 'WAIT':
+                    caption = 'Tic Tac Toe - Waiting for an opponent'
+
+                elif words[0] == 'START':
+                    mark = words[1]
+                    size, win_length = int(words[2]), int(words[3])
+                    board = Board(size, win_length)
+                    open_window(board.window_size)
+                    caption = f"Tic Tac Toe - You're {mark}, waiting for your opponent"
+
+                elif words[0] == 'TURN':
+                    my_turn = True
+                    caption = f'Tic Tac Toe - Your move ({mark})'
+
+                elif words[0] == 'MOVED':
+                    row, col = int(words[2]), int(words[3])
+                    last_square = board.mark_square(row, col, words[1])
+                    if not my_turn:
+                        caption = f"Tic Tac Toe - You're {mark}, waiting for your opponent"
+
+                elif words[0] == 'WIN':
+
+                    # highlight the winning squares
+                    winning_line = board.get_winning_line(last_square, words[1])
+                    if winning_line is not None:
+                        board.record_win(winning_line)
+                    game_over = True
+                    caption = f'Tic Tac Toe - Player {words[1]} wins! Click to play again'
+
+                elif words[0] == 'TIE':
+                    game_over = True
+                    caption = "Tic Tac Toe - It's a Tie! Click to play again"
+
+                elif words[0] == 'LEFT':
+                    game_over = True
+                    my_turn = False
+                    caption = 'Tic Tac Toe - Your opponent left. Click to play again'
+
+                elif words[0] == 'ERROR':
+                    caption = f"Tic Tac Toe - {' '.join(words[1:])}"
+
+            pygame.display.set_caption(caption)
+            pygame.display.update(board.draw())
+
+            # wait for the next frame, letting the connection work in the meantime
+            await asyncio.sleep(1 / frame_rate)
+
+    finally:
+        reader_task.cancel()
+        writer.close()
+        pygame.quit()
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Play tic tac toe on a server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--opponent', default='human', help="'human', 'random' or 'smart'")
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--win-length', type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(run_client(args.host, args.port, args.opponent, args.size, args.win_length))
+
+if __name__ == '__main__':
+    main()
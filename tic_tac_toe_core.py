@@ -0,0 +1,224 @@
+# the board, squares and players without any drawing
+#
+# nothing here uses pygame, so tools that only need the game logic
+# (the AI, the simulator, a server) can import it quickly and without a display
+# tic_tac_toe_part2.py adds the drawing on top of these classes
+
+from collections.abc import Mapping
+from tic_tac_toe_engine import GameState, get_geometry
+
+# the window stays about the same size whatever the board size
+window_length = 450
+
+# Boards only keep a GameState (one int per player) and a few bitmasks
+# the squares are small views onto the board that are made when they're asked for
+# so lots of boards can be kept in memory, by a server or a replay
+
+class Square:
+
+    __slots__ = ('board', 'row', 'col')
+
+    def __init__(self, board, row, col):
+        self.board = board
+        self.row = row
+        self.col = col
+
+    @property
+    def index(self):
+        return self.board.geometry.square_index(self.row, self.col)
+
+    @property
+    def mark(self):
+        # 'X', 'O' or None, read from the board
+        return self.board.state.get_mark(self.index)
+
+    # two views of the same square are the same square
+    def __eq__(self, other):
+        return isinstance(other, Square) and (self.board, self.row, self.col) == (other.board, other.row, other.col)
+
+    def __hash__(self):
+        return hash((self.row, self.col))
+
+class Squares(Mapping):
+
+    # the squares of a board like a dictionary
+    # key is a (row, col) tuple, value is a square view
+    __slots__ = ('board',)
+
+    def __init__(self, board):
+        self.board = board
+
+    def __getitem__(self, position):
+        row, col = position
+        size = self.board.geometry.size
+        if not (0 <= row < size and 0 <= col < size):
+            raise KeyError(position)
+        return self.board.square_class(self.board, row, col)
+
+    def __iter__(self):
+        return self.board.geometry.iter_squares(self.board.geometry.full_board)
+
+    def __len__(self):
+        return self.board.geometry.num_squares
+
+class Board:
+
+    __slots__ = ('geometry', 'state', 'winning_line', 'changed', 'redraw_all')
+
+    # the class of the squares on the board
+    # (the game uses squares that know how to draw themselves)
+    square_class = Square
+
+    def __init__(self, size=3, win_length=3):
+
+        # the rows, cols and winning lines for this size of board
+        self.geometry = get_geometry(size, win_length)
+
+        # create a blank board
+        self.create_new_board()
+
+    # the sizes all come from the geometry, so they aren't stored on each board
+
+    @property
+    def size(self):
+        return self.geometry.size
+
+    @property
+    def win_length(self):
+        return self.geometry.win_length
+
+    @property
+    def square_size(self):
+        return window_length // self.geometry.size
+
+    @property
+    def width(self):
+        return self.square_size * self.geometry.size
+
+    @property
+    def height(self):
+        return self.square_size * self.geometry.size
+
+    @property
+    def window_size(self):
+        return (self.width, self.height)
+
+    @property
+    def squares(self):
+        return Squares(self)
+
+    @property
+    def winning_squares(self):
+        return [self.square_class(self, row, col) for row, col in self.geometry.iter_squares(self.winning_line)]
+
+    def create_new_board(self, size=None, win_length=None):
+
+        # start again with an empty board
+        # (of another size if one is given, so one board can be used for every game)
+        if size is not None:
+            self.geometry = get_geometry(size, win_length)
+
+        # the bitboard that the win checks and the AI work on
+        self.state = GameState(geometry=self.geometry)
+
+        # for highlighting the squares after winning (a bitmask)
+        self.winning_line = 0
+
+        # the squares that changed since the board was last drawn (a bitmask)
+        # the whole board is drawn the first time
+        self.changed = 0
+        self.redraw_all = True
+
+    def square_at(self, click_pos):
+
+        # get the x,y positions of the mouse click
+        click_x, click_y = click_pos
+
+        # return the square at that position in the window, or None if it's outside the board
+        row = click_y // self.square_size
+        col = click_x // self.square_size
+        return self.squares.get((row, col))
+
+    def mark_square(self, row, col, mark):
+
+        # mark the square on the bitboard and return a view of it
+        index = self.geometry.square_index(row, col)
+        self.state.place(index, mark)
+        self.changed |= 1 << index
+        return self.square_class(self, row, col)
+
+    # the win checks only look at the board, they don't change it
+    # so they can be called as often as needed
+    # each check only looks at the lines through the square that was played
+
+    def find_line(self, lines, mark):
+
+        # return the squares of the first line that's full of the mark, or None
+        bits = self.state.get_bits(mark)
+        for line in lines:
+            if bits & line == line:
+                return [self.square_class(self, row, col) for row, col in self.geometry.iter_squares(line)]
+        return None
+
+    def check_row_win(self, square, mark):
+        index = self.geometry.square_index(square.row, square.col)
+        return self.find_line(self.geometry.row_lines_through[index], mark)
+
+    def check_col_win(self, square, mark):
+        index = self.geometry.square_index(square.row, square.col)
+        return self.find_line(self.geometry.col_lines_through[index], mark)
+
+    def check_diagonal_win(self, square, mark):
+
+        # both diagonal directions (upper-left to lower-right and lower-left to upper-right)
+        index = self.geometry.square_index(square.row, square.col)
+        return self.find_line(self.geometry.diagonal_lines_through[index], mark)
+
+    def get_winning_line(self, clicked_square, mark):
+
+        # return the winning squares if the move won the game, or None
+        winning_line = self.check_row_win(clicked_square, mark)
+        if winning_line is None:
+            winning_line = self.check_col_win(clicked_square, mark)
+        if winning_line is None:
+            winning_line = self.check_diagonal_win(clicked_square, mark)
+        return winning_line
+
+    def check_winner(self, clicked_square, mark):
+        return self.get_winning_line(clicked_square, mark) is not None
+
+    def record_win(self, winning_line):
+
+        # highlight the winning squares when the game is over
+        self.winning_line = 0
+        for square in winning_line:
+            self.winning_line |= 1 << square.index
+        self.changed |= self.winning_line
+
+    def check_tie(self):
+
+        # check if there's an open square
+        return self.state.is_full()
+
+class Player:
+
+    __slots__ = ('mark',)
+
+    def __init__(self, mark):
+        self.mark = mark
+
+    def move(self, board, click_pos):
+
+        # get the square that was clicked from the board
+        # (it knows how its squares are laid out in the window)
+        square = board.square_at(click_pos)
+
+        # ignore clicks outside the board
+        if square is None:
+            return None
+
+        # mark the square if it's empty
+        if square.mark is None:
+            return board.mark_square(square.row, square.col, self.mark)
+        else:
+            return None
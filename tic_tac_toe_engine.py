@@ -0,0 +1,312 @@
+# bitboard engine for the tic tac toe game logic
+#
+# a position is stored as one integer per player
+# bit number (row * size + col) is set when that player has a mark on the square
+#
+#   0 | 1 | 2
+#   ---------
+#   3 | 4 | 5
+#   ---------
+#   6 | 7 | 8
+#
+# the board can be any size from 3x3 to 15x15, with any number of marks in a
+# row needed to win (3x3 with 3 in a row is the normal game)
+
+from collections import OrderedDict
+
+# boards with more squares than this only look at moves next to a mark
+# otherwise there are far too many moves to search
+max_full_width_squares = 25
+
+def iter_moves(empty):
+
+    # yield the index of every empty square, lowest index first
+    # (the same row by row order as the squares dictionary)
+    while empty:
+        lowest_bit = empty & -empty
+        yield lowest_bit.bit_length() - 1
+        empty ^= lowest_bit
+
+class Geometry:
+
+    def __init__(self, size=3, win_length=3):
+
+        self.size = size
+        self.win_length = win_length
+        self.num_squares = size * size
+
+        # every square filled
+        self.full_board = (1 << self.num_squares) - 1
+
+        # every run of win_length squares in a row, col or diagonal, as bitmasks
+        # for 3x3 these are the 8 ways to win
+        self.row_lines = []
+        self.col_lines = []
+        self.diagonal_lines = []
+        last_start = size - win_length
+        for row in range(size):
+            for col in range(size):
+
+                if col <= last_start:
+                    self.row_lines.append(self.line_mask([(row, col + i) for i in range(win_length)]))
+
+                if row <= last_start:
+                    self.col_lines.append(self.line_mask([(row + i, col) for i in range(win_length)]))
+
+                # upper-left to lower-right
+                if row <= last_start and col <= last_start:
+                    self.diagonal_lines.append(self.line_mask([(row + i, col + i) for i in range(win_length)]))
+
+                # lower-left to upper-right
+                if row >= win_length - 1 and col <= last_start:
+                    self.diagonal_lines.append(self.line_mask([(row - i, col + i) for i in range(win_length)]))
+
+        self.win_lines = self.row_lines + self.col_lines + self.diagonal_lines
+
+        # the winning lines that go through each square
+        # after a move only these lines need to be checked
+        self.row_lines_through = self.lines_through_each_square(self.row_lines)
+        self.col_lines_through = self.lines_through_each_square(self.col_lines)
+        self.diagonal_lines_through = self.lines_through_each_square(self.diagonal_lines)
+        self.lines_through = self.lines_through_each_square(self.win_lines)
+
+        # the order the AI tries moves in: squares on the most winning lines first
+        # (center, then the corners, then the edges on 3x3)
+        self.move_order = sorted(range(self.num_squares), key=lambda index: -len(self.lines_through[index]))
+        self.move_rank = [0] * self.num_squares
+        for rank, index in enumerate(self.move_order):
+            self.move_rank[index] = rank
+
+        # squares that aren't in the first or last column
+        # so a mark can be shifted sideways without wrapping to the next row
+        self.not_first_col = self.full_board & ~self.line_mask([(row, 0) for row in range(size)])
+        self.not_last_col = self.full_board & ~self.line_mask([(row, size - 1) for row in range(size)])
+
+        # the 8 symmetries of the board (4 rotations, each with and without a mirror)
+        # on 3x3 they're lookup tables so a symmetry is applied to a whole bitmask at once
+        self.symmetries = self.make_symmetries()
+        if self.num_squares <= 9:
+            self.symmetry_tables = [[self.transform_mask(mask, mapping) for mask in range(self.full_board + 1)]
+                                    for mapping in self.symmetries]
+        else:
+            self.symmetry_tables = None
+
+    def square_index(self, row, col):
+        return row * self.size + col
+
+    def square_position(self, index):
+        # returns a (row, col) tuple
+        return divmod(index, self.size)
+
+    def line_mask(self, cells):
+
+        # turn a list of (row, col) tuples into a bitmask
+        mask = 0
+        for row, col in cells:
+            mask |= 1 << self.square_index(row, col)
+        return mask
+
+    def lines_through_each_square(self, lines):
+        return [[line for line in lines if line & (1 << index)] for index in range(self.num_squares)]
+
+    def iter_squares(self, mask):
+
+        # yield the (row, col) tuple of every square in a bitmask
+        for index in iter_moves(mask):
+            yield self.square_position(index)
+
+    def is_winning_move(self, bits, index):
+
+        # check only the lines through the square that was just played
+        for line in self.lines_through[index]:
+            if bits & line == line:
+                return True
+        return False
+
+    def find_winning_line(self, bits):
+
+        # return the first complete line in bits, or None
+        for line in self.win_lines:
+            if bits & line == line:
+                return line
+        return None
+
+    def candidate_moves(self, occupied):
+
+        # the empty squares worth searching
+        empty = self.full_board & ~occupied
+        if self.num_squares <= max_full_width_squares or occupied == 0:
+            return empty
+
+        # on big boards only the squares next to a mark
+        size = self.size
+        left = (occupied >> 1) & self.not_last_col
+        right = (occupied << 1) & self.not_first_col
+        near = occupied | left | right
+        near |= (near << size) | (near >> size)
+        return near & empty
+
+    def rotate(self, row, col):
+        return col, self.size - 1 - row
+
+    def mirror(self, row, col):
+        return row, self.size - 1 - col
+
+    def make_symmetries(self):
+
+        # each symmetry is a list that maps a square index to where that square ends up
+        symmetries = []
+        for flip in (False, True):
+            for turns in range(4):
+                mapping = []
+                for index in range(self.num_squares):
+                    row, col = self.square_position(index)
+                    if flip:
+                        row, col = self.mirror(row, col)
+                    for i in range(turns):
+                        row, col = self.rotate(row, col)
+                    mapping.append(self.square_index(row, col))
+                symmetries.append(mapping)
+        return symmetries
+
+    def transform_mask(self, mask, mapping):
+
+        # move every bit in the mask to its new square
+        new_mask = 0
+        for index in iter_moves(mask):
+            new_mask |= 1 << mapping[index]
+        return new_mask
+
+    def canonical_key(self, mover_bits, other_bits):
+
+        # rotations and reflections of a position have the same score
+        # so they all share the smallest key of the 8
+        shift = self.num_squares
+        if self.symmetry_tables is not None:
+            return min((table[mover_bits] << shift) | table[other_bits] for table in self.symmetry_tables)
+        elif self.num_squares <= max_full_width_squares:
+            return min((self.transform_mask(mover_bits, mapping) << shift) | self.transform_mask(other_bits, mapping)
+                       for mapping in self.symmetries)
+        else:
+            # too many squares to be worth it on big boards
+            return (mover_bits << shift) | other_bits
+
+# one Geometry for each board size and win length
+geometries = dict()
+
+def get_geometry(size=3, win_length=3):
+    if (size, win_length) not in geometries:
+        geometries[(size, win_length)] = Geometry(size, win_length)
+    return geometries[(size, win_length)]
+
+# the normal 3x3 game
+standard_geometry = get_geometry()
+
+class GameState:
+
+    # no __dict__, so a position is only the two bitboards and the geometry
+    __slots__ = ('x_bits', 'o_bits', 'geometry')
+
+    def __init__(self, x_bits=0, o_bits=0, geometry=standard_geometry):
+        self.x_bits = x_bits
+        self.o_bits = o_bits
+        self.geometry = geometry
+
+    def get_bits(self, mark):
+        if mark == 'X':
+            return self.x_bits
+        else:
+            return self.o_bits
+
+    def get_mark(self, index):
+
+        # return the mark on a square, or None if it's empty
+        bit = 1 << index
+        if self.x_bits & bit:
+            return 'X'
+        elif self.o_bits & bit:
+            return 'O'
+        else:
+            return None
+
+    def place(self, index, mark):
+        if mark == 'X':
+            self.x_bits |= 1 << index
+        else:
+            self.o_bits |= 1 << index
+
+    def remove(self, index):
+        self.x_bits &= ~(1 << index)
+        self.o_bits &= ~(1 << index)
+
+    def get_empty(self):
+        return self.geometry.full_board & ~(self.x_bits | self.o_bits)
+
+    def available_moves(self):
+        return iter_moves(self.get_empty())
+
+    def is_winning_move(self, index, mark):
+        return self.geometry.is_winning_move(self.get_bits(mark), index)
+
+    def winning_line(self, mark):
+        return self.geometry.find_winning_line(self.get_bits(mark))
+
+    def is_full(self):
+        return self.x_bits | self.o_bits == self.geometry.full_board
+
+    def copy(self):
+        return GameState(self.x_bits, self.o_bits, self.geometry)
+
+class TranspositionTable:
+
+    def __init__(self, max_size=100000):
+
+        # what's known about positions that were already searched
+        # key is built from a canonical_key, so symmetric positions share an entry
+        # the order of the entries is the least recently used order
+        self.entries = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+        # forget the least recently used position when the table is full
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+# one table for every AI in the process, so what's learned in one game
+# is still known in the next one
+# boards of different sizes get different tables because their keys would clash
+# and AIs that score positions with an evaluate function of their own get tables
+# of their own too (None is the AI's default one), because the scores of searches
+# that stopped before the end of the game come from it
+shared_tables = dict()
+
+def get_shared_table(geometry=standard_geometry, evaluate=None):
+    if (geometry, evaluate) not in shared_tables:
+        shared_tables[(geometry, evaluate)] = TranspositionTable()
+    return shared_tables[(geometry, evaluate)]
+
+shared_table = get_shared_table()
@@ -0,0 +1,256 @@
+# everything about every 3x3 position that can come up in a game
+#
+# for each position: the outcome with best play, all the best moves, how many
+# moves until the game ends with best play, and how many of all the possible
+# games from there are won, drawn and lost
+#
+# the index is built in a fraction of a second and kept in tic_tac_toe_index.bin
+# so it only has to be built once
+#
+#   python tic_tac_toe_index.py
+#
+# positions are numbered in base 3 from the player to move's point of view
+# (digit 1 = the player to move's mark, digit 2 = the other mark) like the opening book,
+# so games where O goes first use the same entries
+#
+# file layout (little endian):
+#   magic      4 bytes   b'TTTI'
+#   version    2 bytes
+#   entries    4 bytes   number of positions (3 ** 9)
+#   checksum   4 bytes   crc32 of the rest of the file
+#   then one array after another, each with one value per position:
+#   outcomes   1 byte    1 win, 0 tie, -1 loss for the player to move, or no_entry
+#                        (finished games are in the index too, with no best moves)
+#   best moves 2 bytes   bitmask of every best move
+#   depths     1 byte    moves until the game ends with best play
+#   wins       4 bytes   the games from here the player to move wins
+#   draws      4 bytes
+#   losses     4 bytes
+
+import os
+import struct
+import sys
+import zlib
+from array import array
+from tic_tac_toe_engine import iter_moves, standard_geometry
+
+num_squares = standard_geometry.num_squares
+full_board = standard_geometry.full_board
+is_winning_move = standard_geometry.is_winning_move
+
+magic = b'TTTI'
+version = 1
+header = struct.Struct('<4sHII')
+num_entries = 3 ** num_squares
+
+# the outcome of positions that can't come up in a game
+no_entry = 2
+
+# the type of each array, in the order they're in the file
+array_types = ('b', 'H', 'B', 'I', 'I', 'I')
+
+default_index_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tic_tac_toe_index.bin')
+
+# base 3 value of every bitmask, so a position is numbered with two lookups
+ternary = [sum(3 ** index for index in iter_moves(mask)) for mask in range(full_board + 1)]
+
+def position_number(mover_bits, other_bits):
+    return ternary[mover_bits] + 2 * ternary[other_bits]
+
+def move_key(outcome, depth):
+
+    # how good a move is: winning beats a tie beats losing
+    # a win is better the sooner it comes, and a loss the later
+    if outcome > 0:
+        return (outcome, -depth)
+    elif outcome < 0:
+        return (outcome, depth)
+    else:
+        return (outcome, 0)
+
+class PositionIndex:
+
+    def __init__(self, arrays):
+        self.outcomes, self.best_moves, self.depths, self.wins, self.draws, self.losses = arrays
+        self.geometry = standard_geometry
+
+    def lookup(self, mover_bits, other_bits):
+
+        # return (outcome, best moves bitmask, depth, wins, draws, losses) for the player to move
+        # or None if the position can't come up in a game
+        number = position_number(mover_bits, other_bits)
+        outcome = self.outcomes[number]
+        if outcome == no_entry:
+            return None
+        return (outcome, self.best_moves[number], self.depths[number], self.wins[number], self.draws[number],
+                self.losses[number])
+
+    def best_move(self, mover_bits, other_bits):
+
+        # the lowest best move (the one the smart AI plays), or None
+        number = position_number(mover_bits, other_bits)
+        best_moves = self.best_moves[number]
+        if self.outcomes[number] == no_entry or best_moves == 0:
+            return None
+        return (best_moves & -best_moves).bit_length() - 1
+
+    def move_outcomes(self, mover_bits, other_bits):
+
+        # return {square index: (outcome, depth)} for every move of the player to move
+        # (the outcome for the player to move after making that move)
+        results = dict()
+        for index in iter_moves(full_board & ~(mover_bits | other_bits)):
+            new_bits = mover_bits | (1 << index)
+            if is_winning_move(new_bits, index):
+                results[index] = (1, 1)
+            elif new_bits | other_bits == full_board:
+                results[index] = (0, 1)
+            else:
+                number = position_number(other_bits, new_bits)
+                results[index] = (-self.outcomes[number], self.depths[number] + 1)
+        return results
+
+    def to_bytes(self):
+
+        # the arrays are kept in the machine's byte order, the file is little endian
+        data = []
+        for values in (self.outcomes, self.best_moves, self.depths, self.wins, self.draws, self.losses):
+            if sys.byteorder == 'big':
+                values = array(values.typecode, values)
+                values.byteswap()
+            data.append(values.tobytes())
+        return b''.join(data)
+
+def build_index():
+
+    # solve every position that can be reached from the empty board
+    outcomes = array('b', [no_entry]) * num_entries
+    best_moves = array('H', [0]) * num_entries
+    depths = array('B', [0]) * num_entries
+    wins = array('I', [0]) * num_entries
+    draws = array('I', [0]) * num_entries
+    losses = array('I', [0]) * num_entries
+
+    def add_game_over(mover_bits, other_bits, outcome):
+
+        # a finished game, there are no moves left to make
+        number = position_number(mover_bits, other_bits)
+        outcomes[number] = outcome
+        if outcome < 0:
+            losses[number] = 1
+        else:
+            draws[number] = 1
+
+    def solve(mover_bits, other_bits):
+
+        number = position_number(mover_bits, other_bits)
+        if outcomes[number] != no_entry:
+            return number
+
+        best_key = None
+        best_mask = 0
+        best_depth = 0
+        position_wins = 0
+        position_draws = 0
+        position_losses = 0
+        for index in iter_moves(full_board & ~(mover_bits | other_bits)):
+
+            new_bits = mover_bits | (1 << index)
+
+            # the outcome of the move, from the other player's point of view if the game goes on
+            if is_winning_move(new_bits, index):
+                outcome, depth = 1, 1
+                position_wins += 1
+                add_game_over(other_bits, new_bits, -1)
+            elif new_bits | other_bits == full_board:
+                outcome, depth = 0, 1
+                position_draws += 1
+                add_game_over(other_bits, new_bits, 0)
+            else:
+                child = solve(other_bits, new_bits)
+                outcome = -outcomes[child]
+                depth = depths[child] + 1
+                position_wins += losses[child]
+                position_draws += draws[child]
+                position_losses += wins[child]
+
+            key = move_key(outcome, depth)
+            if best_key is None or key > best_key:
+                best_key = key
+                best_mask = 1 << index
+                best_depth = depth
+            elif key == best_key:
+                best_mask |= 1 << index
+
+        outcomes[number] = best_key[0]
+        best_moves[number] = best_mask
+        depths[number] = best_depth
+        wins[number] = position_wins
+        draws[number] = position_draws
+        losses[number] = position_losses
+        return number
+
+    solve(0, 0)
+    return PositionIndex((outcomes, best_moves, depths, wins, draws, losses))
+
+def write_index(index, path=default_index_path):
+    data = index.to_bytes()
+    with open(path, 'wb') as index_file:
+        index_file.write(header.pack(magic, version, num_entries, zlib.crc32(data)))
+        index_file.write(data)
+    return path
+
+def load_index(path=default_index_path):
+
+    # return the PositionIndex in the file, or None if it's missing, out of date or corrupt
+    try:
+        with open(path, 'rb') as index_file:
+            data = index_file.read()
+    except OSError:
+        return None
+
+    if len(data) < header.size:
+        return None
+    file_magic, file_version, file_entries, checksum = header.unpack_from(data)
+    if file_magic != magic or file_version != version or file_entries != num_entries:
+        return None
+    if zlib.crc32(data[header.size:]) != checksum:
+        return None
+
+    arrays = []
+    offset = header.size
+    for type_code in array_types:
+        values = array(type_code)
+        length = values.itemsize * num_entries
+        values.frombytes(data[offset:offset + length])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        arrays.append(values)
+        offset += length
+    if offset != len(data):
+        return None
+    return PositionIndex(arrays)
+
+# the index is loaded once and shared by every AI and the hints
+loaded_indexes = dict()
+
+def get_index(path=default_index_path):
+
+    # load the index, or build it and save it for next time
+    if path not in loaded_indexes:
+        index = load_index(path)
+        if index is None:
+            index = build_index()
+            try:
+                write_index(index, path)
+            except OSError:
+                pass
+        loaded_indexes[path] = index
+    return loaded_indexes[path]
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        path = write_index(build_index(), sys.argv[1])
+    else:
+        path = write_index(build_index())
+    print(f'wrote {path}')
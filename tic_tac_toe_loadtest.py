@@ -0,0 +1,277 @@
+# lots of simulated players for tic_tac_toe_server.py
+#
+#   python tic_tac_toe_server.py &
+#   python tic_tac_toe_loadtest.py --clients 4000 --games 5
+#
+# every client connects, then plays its games with random moves
+# against another client (human) or against the server's AI
+# at the end it prints how many games were going on at once, games and moves
+# per second, and how long the server took to answer a move
+#
+#   python tic_tac_toe_service.py &
+#   python tic_tac_toe_loadtest.py --service --clients 100 --requests 200
+#
+# load tests the best move service instead: every client sends best move
+# requests for random positions, one after another on one connection
+# it prints requests per second, the latency percentiles and how many of the
+# answers came from the service's cache
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from tic_tac_toe_engine import GameState, get_geometry
+
+class LoadStats:
+
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.errors = 0
+        self.active_games = 0
+        self.peak_active_games = 0
+        self.clients = 0
+        self.clients_done = 0
+
+        # seconds from sending a move until the server said it was made
+        self.latencies = []
+
+    def game_started(self):
+        self.active_games += 1
+        self.peak_active_games = max(self.peak_active_games, self.active_games)
+
+    def game_ended(self):
+        self.active_games -= 1
+        self.games += 1
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+async def run_client(host, port, opponent, games, size, win_length, stats, rng):
+
+    reader, writer = await asyncio.open_connection(host, port)
+    geometry = get_geometry(size, win_length)
+
+    def send(message):
+        writer.write(message.encode('ascii') + b'\n')
+
+    async def read_words(waiting):
+
+        # a client can be left waiting for an opponent when everyone else has
+        # played all their games, then it gives up
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), 1)
+            except asyncio.TimeoutError:
+                if waiting and stats.clients_done == stats.clients - 1:
+                    return None
+                continue
+            if not line:
+                return None
+            return line.decode('ascii').split()
+
+    for game in range(games):
+
+        send(f'PLAY {opponent} {size} {win_length}')
+        state = None
+        mark = None
+        move_time = None
+
+        while True:
+            words = await read_words(state is None)
+            if words is None:
+                break
+
+            if words[0] == 'START':
+                mark = words[1]
+                state = GameState(geometry=geometry)
+                stats.game_started()
+
+            elif words[0] == 'TURN':
+
+                # a random empty square
+                index = rng.choice(list(state.available_moves()))
+                row, col = geometry.square_position(index)
+                move_time = time.perf_counter()
+                send(f'MOVE {row} {col}')
+
+            elif words[0] == 'MOVED':
+                row, col = int(words[2]), int(words[3])
+                state.place(geometry.square_index(row, col), words[1])
+                stats.moves += 1
+                if words[1] == mark and move_time is not None:
+                    stats.latencies.append(time.perf_counter() - move_time)
+                    move_time = None
+
+            elif words[0] in ('WIN', 'TIE', 'LEFT'):
+                stats.game_ended()
+                break
+
+            elif words[0] == 'ERROR':
+                stats.errors += 1
+
+        if words is None:
+            break
+
+    stats.clients_done += 1
+    send('QUIT')
+    await writer.drain()
+    writer.close()
+
+async def run_load_test(host='127.0.0.1', port=8765, clients=1000, games=5, opponent='human', size=3, win_length=3,
+                        seed=0):
+
+    stats = LoadStats()
+    stats.clients = clients
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+    await asyncio.gather(*[run_client(host, port, opponent, games, size, win_length, stats, rng)
+                           for client in range(clients)])
+    seconds = time.perf_counter() - start_time
+
+    # both clients of a human game count it, and both hear about every move
+    if opponent == 'human':
+        players_per_game = 2
+    else:
+        players_per_game = 1
+    games = stats.games // players_per_game
+    moves = stats.moves // players_per_game
+
+    return {
+        'clients': clients,
+        'games': games,
+        'moves': moves,
+        'errors': stats.errors,
+        'peak_active_games': stats.peak_active_games // players_per_game,
+        'seconds': seconds,
+        'games_per_sec': games / seconds,
+        'moves_per_sec': moves / seconds,
+        'p50_move_ms': percentile(stats.latencies, 50) * 1000,
+        'p99_move_ms': percentile(stats.latencies, 99) * 1000,
+    }
+
+def random_positions(count, size, win_length, rng):
+
+    # the boards of positions from random games that aren't over yet
+    # there are only a few thousand 3x3 positions, so some of them will be the same
+    geometry = get_geometry(size, win_length)
+    positions = []
+    while len(positions) < count:
+        state = GameState(geometry=geometry)
+        mark = 'X'
+        for move in range(rng.randrange(geometry.num_squares)):
+            index = rng.choice(list(state.available_moves()))
+            state.place(index, mark)
+            if state.is_winning_move(index, mark):
+                state.remove(index)
+                break
+            if mark == 'X':
+                mark = 'O'
+            else:
+                mark = 'X'
+        if not state.is_full():
+            positions.append(''.join(state.get_mark(index) or '.' for index in range(geometry.num_squares)))
+    return positions
+
+async def http_request(reader, writer, method, path, request=None):
+
+    # send a request on a keep-alive connection, return (status, JSON response)
+    if request is None:
+        body = b''
+    else:
+        body = json.dumps(request).encode('utf-8')
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, colon, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def run_service_client(host, port, requests, positions, win_length, stats, rng):
+
+    reader, writer = await asyncio.open_connection(host, port)
+    for request in range(requests):
+        start_time = time.perf_counter()
+        status, response = await http_request(reader, writer, 'POST', '/move',
+                                              {'board': rng.choice(positions), 'win_length': win_length})
+        stats.latencies.append(time.perf_counter() - start_time)
+
+        # every answer counts as a move
+        stats.moves += 1
+        if status != 200:
+            stats.errors += 1
+    writer.close()
+
+async def run_service_load_test(host='127.0.0.1', port=8080, clients=100, requests=100, positions=1000, size=3,
+                                win_length=3, seed=0):
+
+    stats = LoadStats()
+    rng = random.Random(seed)
+    boards = random_positions(positions, size, win_length, rng)
+
+    # the cache stats from before and after, so only this test's requests count
+    reader, writer = await asyncio.open_connection(host, port)
+    status, before = await http_request(reader, writer, 'GET', '/stats')
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[run_service_client(host, port, requests, boards, win_length, stats, rng)
+                           for client in range(clients)])
+    seconds = time.perf_counter() - start_time
+
+    status, after = await http_request(reader, writer, 'GET', '/stats')
+    writer.close()
+    hits = after['cache_hits'] - before['cache_hits']
+    batches = after['batches'] - before['batches']
+
+    return {
+        'clients': clients,
+        'requests': stats.moves,
+        'errors': stats.errors,
+        'seconds': seconds,
+        'requests_per_sec': stats.moves / seconds,
+        'p50_ms': percentile(stats.latencies, 50) * 1000,
+        'p99_ms': percentile(stats.latencies, 99) * 1000,
+        'p999_ms': percentile(stats.latencies, 99.9) * 1000,
+        'max_ms': max(stats.latencies, default=0) * 1000,
+        'cache_hit_rate': hits / (after['requests'] - before['requests']),
+        'searches': after['searches'] - before['searches'],
+        'batches': batches,
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Play lots of games on a tic tac toe server at once.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help='8765 for the game server, 8080 for the service')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--games', type=int, default=5, help='games each client plays')
+    parser.add_argument('--opponent', default='human', help="'human' (another client), 'random' or 'smart'")
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--win-length', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--service', action='store_true', help='load test tic_tac_toe_service.py instead')
+    parser.add_argument('--requests', type=int, default=100, help='requests each client sends to the service')
+    parser.add_argument('--positions', type=int, default=1000, help='random positions to ask the service about')
+    args = parser.parse_args()
+
+    if args.service:
+        results = asyncio.run(run_service_load_test(args.host, args.port or 8080, args.clients, args.requests,
+                                                    args.positions, args.size, args.win_length, args.seed))
+    else:
+        results = asyncio.run(run_load_test(args.host, args.port or 8765, args.clients, args.games, args.opponent,
+                                            args.size, args.win_length, args.seed))
+    for name, value in results.items():
+        print(f'{name:<18} {value:.6g}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+# monte carlo tree search, an AI that plays better the longer it thinks
+#
+# instead of searching every move to the end of the game like the smart AI,
+# it plays lots of random games (playouts) from the position and grows a tree
+# of the moves it tried, going down the moves that won the most playouts more
+# often (UCT), but still trying the others now and then
+# the move it plays is the one it tried the most
+#
+# so it can be given as much time (or as many playouts) as a move is worth,
+# on any board size
+#
+# the tree is kept between moves: when the AI moves again it starts from the
+# part of the tree under the moves that were played since, not from nothing
+#
+# with more than one worker, every other worker process grows a tree of its own
+# from the same position with its own seed, and the playouts of the moves at
+# the root of every tree are added up before choosing (root parallelism)
+# a worker process keeps one tree for each AI between moves too, whichever of
+# the tasks of a move the pool hands it
+
+import math
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from tic_tac_toe_engine import get_geometry, iter_moves
+
+# how much UCT favours moves that haven't been tried much over moves that won a lot
+exploration = math.sqrt(2)
+
+# playouts for each move if there's no time limit or number of playouts given
+default_playouts = 5000
+
+# what a playout is worth to the player who made the move: a win, a tie or a loss
+win = 1.0
+tie = 0.5
+loss = 0.0
+
+class Node:
+
+    __slots__ = ('move', 'parent', 'children', 'untried', 'result', 'visits', 'wins')
+
+    def __init__(self, move, parent, untried, result):
+
+        # the move that led here (None at the root) and the moves tried from here
+        self.move = move
+        self.parent = parent
+        self.children = []
+
+        # bitmask of the moves that haven't been tried yet
+        self.untried = untried
+
+        # win or tie for the player who made the move if it ended the game, otherwise None
+        self.result = result
+
+        # playouts through this node, and what they were worth to the player who made the move
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self):
+
+        # the child with the best upper confidence bound (UCT)
+        log_visits = math.log(self.visits)
+        best_child = None
+        best_bound = None
+        for child in self.children:
+            bound = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if best_bound is None or bound > best_bound:
+                best_child = child
+                best_bound = bound
+        return best_child
+
+def other_mark(mark):
+    if mark == 'X':
+        return 'O'
+    return 'X'
+
+class MCTS:
+
+    def __init__(self, max_playouts=None, workers=1, rng=None):
+
+        # playouts for each move, or None to stop at the deadline
+        # (whichever comes first if there's both)
+        self.max_playouts = max_playouts
+
+        # processes to grow trees in (this one counts as one of them)
+        self.workers = workers
+
+        if rng is None:
+            rng = random.Random()
+        self.rng = rng
+
+        # names this tree in the worker processes, so they can keep theirs between moves too
+        self.key = self.rng.getrandbits(64)
+
+        # counts the moves chosen, so a worker process grows its tree only once for each
+        self.searches = 0
+
+        # the tree, and the position at its root
+        self.root = None
+        self.root_x_bits = 0
+        self.root_o_bits = 0
+        self.root_mark = None
+        self.geometry = None
+
+        # playouts done for the last move, by every worker
+        self.playouts = 0
+
+        # set by stop() from another thread to end a search early
+        self.stop_requested = False
+
+    def stop(self):
+        self.stop_requested = True
+
+    def choose_move(self, state, mark, deadline=None):
+
+        # return the index of the square for mark to play in a GameState, without changing it
+        # thinking until deadline (a time.perf_counter() time) or for max_playouts playouts
+        self.stop_requested = False
+        self.searches += 1
+        self.advance(state, mark)
+        max_playouts = self.max_playouts
+        if max_playouts is None and deadline is None:
+            max_playouts = default_playouts
+        time_limit = None
+        if deadline is not None:
+            time_limit = deadline - time.perf_counter()
+
+        # start the other workers, then grow this tree while they grow theirs
+        futures = []
+        for i in range(self.workers - 1):
+            futures.append(get_executor(self.workers - 1).submit(
+                grow_worker_tree, self.key, self.searches, state.x_bits, state.o_bits, mark, self.geometry.size,
+                self.geometry.win_length, max_playouts, time_limit, self.rng.getrandbits(64)))
+
+        self.playouts = self.grow(deadline, max_playouts)
+        visits = root_visits(self.root)
+
+        # add up the root moves of every tree
+        # (if the search was stopped, don't wait for the other workers)
+        if not self.stop_requested:
+            for future in futures:
+                worker_visits, worker_playouts = future.result()
+                self.playouts += worker_playouts
+                for move, count in worker_visits.items():
+                    visits[move] = visits.get(move, 0) + count
+
+        # the move tried the most, the lowest square if there's a tie
+        # (or the first empty square if there was no time to try any)
+        if not visits:
+            return next(iter_moves(state.get_empty()), None)
+        return min(visits, key=lambda move: (-visits[move], move))
+
+    def advance(self, state, mark):
+
+        # move the root down to the position, keeping what was found out about it
+        # or start a new tree if the position isn't in the tree
+        node = self.root
+        x_bits = self.root_x_bits
+        o_bits = self.root_o_bits
+        to_move = self.root_mark
+        if self.geometry is not state.geometry or x_bits & ~state.x_bits or o_bits & ~state.o_bits:
+            node = None
+
+        while node is not None and (x_bits != state.x_bits or o_bits != state.o_bits):
+
+            # the child for the move that was played next
+            if to_move == 'X':
+                new_bits = state.x_bits & ~x_bits
+            else:
+                new_bits = state.o_bits & ~o_bits
+            next_node = None
+            for child in node.children:
+                if new_bits & (1 << child.move):
+                    next_node = child
+                    break
+            node = next_node
+            if node is not None:
+                if to_move == 'X':
+                    x_bits |= 1 << node.move
+                else:
+                    o_bits |= 1 << node.move
+                to_move = other_mark(to_move)
+
+        if node is None or to_move != mark or node.result is not None:
+            self.geometry = state.geometry
+            node = Node(None, None, self.geometry.candidate_moves(state.x_bits | state.o_bits), None)
+
+        node.parent = None
+        self.root = node
+        self.root_x_bits = state.x_bits
+        self.root_o_bits = state.o_bits
+        self.root_mark = mark
+
+    def grow(self, deadline, max_playouts):
+
+        # do playouts from the root until the deadline or max_playouts, return how many
+        if self.root_mark == 'X':
+            mover_bits = self.root_x_bits
+            other_bits = self.root_o_bits
+        else:
+            mover_bits = self.root_o_bits
+            other_bits = self.root_x_bits
+
+        playouts = 0
+        while max_playouts is None or playouts < max_playouts:
+            if self.stop_requested:
+                break
+            if deadline is not None and playouts % 16 == 0 and time.perf_counter() > deadline:
+                break
+            self.playout(mover_bits, other_bits)
+            playouts += 1
+        return playouts
+
+    def playout(self, mover_bits, other_bits):
+
+        geometry = self.geometry
+        rng = self.rng
+
+        # go down the tree to a node with moves that haven't been tried
+        node = self.root
+        while not node.untried and node.children and node.result is None:
+            node = node.select_child()
+            mover_bits, other_bits = other_bits, mover_bits | (1 << node.move)
+
+        # try one of them
+        if node.result is None and node.untried:
+            moves = list(iter_moves(node.untried))
+            index = moves[rng.randrange(len(moves))]
+            node.untried &= ~(1 << index)
+            new_bits = mover_bits | (1 << index)
+            if geometry.is_winning_move(new_bits, index):
+                child = Node(index, node, 0, win)
+            elif new_bits | other_bits == geometry.full_board:
+                child = Node(index, node, 0, tie)
+            else:
+                child = Node(index, node, geometry.candidate_moves(new_bits | other_bits), None)
+            node.children.append(child)
+            node = child
+            mover_bits, other_bits = other_bits, new_bits
+
+        # play the rest of the game randomly
+        # value is what the game was worth to the player who made the move into node
+        if node.result is not None:
+            value = node.result
+        else:
+            value = random_game(geometry, mover_bits, other_bits, rng)
+
+        # and count it in every node on the way back up, for the player who moved into each one
+        while node is not None:
+            node.visits += 1
+            node.wins += value
+            value = 1.0 - value
+            node = node.parent
+
+def random_game(geometry, mover_bits, other_bits, rng):
+
+    # play random moves to the end of the game
+    # return what the game was worth to the player who didn't move first (win, tie or loss)
+    moves = list(iter_moves(geometry.full_board & ~(mover_bits | other_bits)))
+    rng.shuffle(moves)
+    is_winning_move = geometry.is_winning_move
+    value = loss
+    for index in moves:
+        mover_bits |= 1 << index
+        if is_winning_move(mover_bits, index):
+            return value
+        mover_bits, other_bits = other_bits, mover_bits
+        value = 1.0 - value
+    return tie
+
+def root_visits(root):
+
+    # {move: playouts} for the moves at the root of a tree
+    return {child.move: child.visits for child in root.children}
+
+# a process pool for the workers, made the first time more than one is wanted
+executors = dict()
+
+def get_executor(workers):
+    if workers not in executors:
+        executors[workers] = ProcessPoolExecutor(max_workers=workers)
+    return executors[workers]
+
+def start_workers(workers):
+
+    # start the worker processes before they're needed, so the first move doesn't wait for them
+    executor = get_executor(workers)
+    for future in [executor.submit(int) for i in range(workers)]:
+        future.result()
+
+# the trees of each worker process, so they can be kept between moves
+# only the last few are kept, there's a new one every game
+worker_trees = OrderedDict()
+max_worker_trees = 16
+
+def grow_worker_tree(key, search, x_bits, o_bits, mark, size, win_length, max_playouts, time_limit, seed):
+
+    # runs in a worker process: grow this process's tree for key from the position
+    # return ({move: playouts} at the root, playouts)
+    from tic_tac_toe_engine import GameState
+
+    if key not in worker_trees:
+        worker_trees[key] = MCTS()
+        if len(worker_trees) > max_worker_trees:
+            worker_trees.popitem(last=False)
+    worker_trees.move_to_end(key)
+    tree = worker_trees[key]
+
+    # the pool doesn't say which process gets which task, so one process can get two
+    # tasks of the same move; its tree's playouts are only counted for the first one
+    if tree.searches == search:
+        return dict(), 0
+    tree.searches = search
+    tree.rng.seed(seed)
+
+    tree.advance(GameState(x_bits, o_bits, get_geometry(size, win_length)), mark)
+    deadline = None
+    if time_limit is not None:
+        deadline = time.perf_counter() + time_limit
+    playouts = tree.grow(deadline, max_playouts)
+    return root_visits(tree.root), playouts
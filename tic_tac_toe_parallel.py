@@ -0,0 +1,245 @@
+# the smart AI's search split over a pool of processes
+#
+#   ai = AI('O', 'smart', workers=4)
+#
+# every move at the root of the search is searched in a worker process, from
+# a snapshot of the bitboards (two ints, so nothing is shared but the bounds)
+# on boards bigger than 3x3, each of the player's replies to a root move is a
+# task of its own, so there are enough tasks to keep every worker busy
+# (a root move is only as good as the player's best reply to it)
+#
+# the bounds are shared: the best score found so far at the root (alpha) and
+# the score of the player's best reply so far to each root move (beta) are
+# kept in shared memory and every task reads them when it starts, so it can
+# skip what can't change them, and the replies still waiting for a root move
+# that's already been refuted are dropped
+#
+# the move chosen is the same whatever the number of workers: the best score,
+# and the lowest square if more than one move has it
+# every score that could be the best is searched with a window that makes it
+# exact, and each worker keeps a new transposition table for every search
+#
+#   python tic_tac_toe_bench.py parallel_search
+#
+# reports how much faster the search gets for 1 to os.cpu_count() workers
+
+import itertools
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from tic_tac_toe_engine import TranspositionTable, get_geometry
+from tic_tac_toe_ai import AI, SearchTimeout, infinity, win_score
+
+# searches that can run at the same time (from different threads)
+# each one has a slot of numbers in shared memory: the root alpha, a stop flag
+# and then a beta for every square
+max_searches = 64
+slot_size = 2 + 15 * 15
+search_numbers = itertools.count()
+search_lock = threading.Lock()
+
+# boards with more squares than this split the search at the player's replies too
+split_replies_squares = 9
+
+# a pool for each number of workers, made the first time it's needed
+# with the shared bounds handed to every process when it starts
+pools = dict()
+shared_bounds = None
+
+def init_worker(bounds):
+    global shared_bounds
+    shared_bounds = bounds
+
+def get_pool(workers):
+    global shared_bounds
+    with search_lock:
+        if shared_bounds is None:
+            shared_bounds = multiprocessing.Array('q', max_searches * slot_size)
+        if workers not in pools:
+            pools[workers] = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                 initargs=(shared_bounds,))
+    return pools[workers]
+
+class WorkerAI(AI):
+
+    # the AI searching in a worker process
+    # it also stops when the search it's part of is stopped
+    def __init__(self, mark, slot, max_depth, evaluate):
+        super().__init__(mark, 'smart', table=TranspositionTable(), book=False, index=False, max_depth=max_depth,
+                         evaluate=evaluate)
+        self.slot = slot
+
+    def is_out_of_time(self):
+        if shared_bounds[self.slot * slot_size + 1]:
+            return True
+        return super().is_out_of_time()
+
+# the AI of each search a worker has taken part in, only the last few are kept
+worker_ais = OrderedDict()
+max_worker_ais = 8
+
+def search_task(slot, search_key, mark, size, win_length, ai_bits, player_bits, moves, depth, time_left, max_depth,
+                evaluate):
+
+    # runs in a worker process: search the position after moves (the AI's root move
+    # and maybe the player's reply) and return (score, nodes)
+    # the score is None if the search was stopped
+    if search_key not in worker_ais:
+        worker_ais[search_key] = WorkerAI(mark, slot, max_depth, evaluate)
+        if len(worker_ais) > max_worker_ais:
+            worker_ais.popitem(last=False)
+    ai = worker_ais[search_key]
+
+    ai.slot = slot
+    ai.geometry = get_geometry(size, win_length)
+    ai.killer_moves = [[] for i in range(depth + 1)]
+    ai.nodes = 0
+    ai.stop_requested = False
+    if time_left is None:
+        ai.deadline = None
+    else:
+        ai.deadline = time.perf_counter() + time_left
+
+    # the best score at the root so far
+    alpha = shared_bounds[slot * slot_size]
+
+    try:
+        if len(moves) == 1:
+            move = moves[0]
+            score = ai.minimax(ai_bits | (1 << move), player_bits, move, False, depth - 1, alpha, infinity, 1)
+        else:
+
+            # and the player's best reply so far to the root move
+            # (a reply that's no better for the player can't change the move's score)
+            move, reply = moves
+            beta = shared_bounds[slot * slot_size + 2 + move]
+            if alpha >= beta:
+                return beta, 0
+            score = ai.minimax(ai_bits | (1 << move), player_bits | (1 << reply), reply, True, depth - 2, alpha, beta,
+                               2)
+    except SearchTimeout:
+        return None, ai.nodes
+    return score, ai.nodes
+
+def parallel_search_root(ai, ai_bits, player_bits, depth):
+
+    # search_root on ai.workers processes, return (best move, best score)
+    # raises SearchTimeout if the AI runs out of time or is stopped
+    geometry = ai.geometry
+    pool = get_pool(ai.workers)
+
+    # a slot in shared memory for this search's bounds
+    with search_lock:
+        search_number = next(search_numbers)
+    slot = search_number % max_searches
+    offset = slot * slot_size
+    shared_bounds[offset:offset + slot_size] = [-infinity, 0] + [infinity] * (slot_size - 2)
+
+    # the worker AIs keep their table for every depth of the same move
+    search_key = (id(ai), ai.search_start)
+
+    time_left = None
+    if ai.deadline is not None:
+        time_left = ai.deadline - time.perf_counter()
+
+    # a root move that wins doesn't need a worker
+    # the others are searched whole, or one task for each of the player's replies
+    scores = dict()
+    task_moves = []
+    split_replies = geometry.num_squares > split_replies_squares and depth >= 3
+    for move in ai.order_moves(geometry.candidate_moves(ai_bits | player_bits), 0, None):
+        new_bits = ai_bits | (1 << move)
+        occupied = new_bits | player_bits
+        if geometry.is_winning_move(new_bits, move):
+            scores[move] = win_score - 1
+        elif occupied == geometry.full_board or not split_replies:
+            task_moves.append((move,))
+        else:
+            task_moves.extend((move, reply) for reply in ai.order_moves(geometry.candidate_moves(occupied), 1, None))
+
+    # the best score so far, for the bounds
+    alpha = -infinity
+    for score in scores.values():
+        alpha = max(alpha, score - 1)
+    shared_bounds[offset] = alpha
+
+    # the tasks still to finish for each root move, and the futures of the tasks
+    pending = dict()
+    tasks = dict()
+    for moves in task_moves:
+        pending[moves[0]] = pending.get(moves[0], 0) + 1
+        future = pool.submit(search_task, slot, search_key, ai.mark, geometry.size, geometry.win_length, ai_bits,
+                             player_bits, moves, depth, time_left, ai.max_depth, ai.evaluate)
+        tasks[future] = moves
+
+    # the lowest score of the player's replies to each root move so far
+    reply_scores = dict()
+
+    def refute(move):
+
+        # the player has a reply to the move that's no better for the AI than the best move so far
+        # so drop the rest of its replies
+        del pending[move]
+        for other_future, other_moves in list(tasks.items()):
+            if other_moves[0] == move and other_future.cancel():
+                del tasks[other_future]
+
+    try:
+        while pending:
+            done, not_done = wait(tasks, timeout=0.05, return_when=FIRST_COMPLETED)
+            if ai.is_out_of_time():
+                raise SearchTimeout()
+
+            for future in done:
+                moves = tasks.pop(future)
+                move = moves[0]
+                score, nodes = future.result()
+                ai.nodes += nodes
+                if move not in pending:
+                    continue
+                if score is None:
+                    raise SearchTimeout()
+
+                if len(moves) == 2:
+                    if score <= alpha:
+                        refute(move)
+                        continue
+
+                    # a score at or above beta is only a bound, but then the lower score
+                    # that set beta is the one that counts
+                    if score < reply_scores.get(move, infinity):
+                        reply_scores[move] = score
+                        shared_bounds[offset + 2 + move] = score
+                else:
+                    reply_scores[move] = score
+
+                pending[move] -= 1
+                if pending[move] == 0:
+                    del pending[move]
+                    scores[move] = reply_scores[move]
+
+                    # only moves at least as good as the best one need an exact score
+                    # (moves with the same score are needed to pick the lowest one)
+                    if scores[move] - 1 > alpha:
+                        alpha = scores[move] - 1
+                        shared_bounds[offset] = alpha
+
+                        # which can refute moves that are still being searched
+                        for other_move in list(pending):
+                            if reply_scores.get(other_move, infinity) <= alpha:
+                                refute(other_move)
+
+    finally:
+
+        # stop the tasks that are still running for refuted moves (or because time ran out)
+        # without waiting for them
+        shared_bounds[offset + 1] = 1
+        for future in tasks:
+            future.cancel()
+
+    # the best score, and the lowest square if more than one move has it
+    best_score = max(scores.values())
+    best_move = min(move for move, score in scores.items() if score == best_score)
+    return best_move, best_score
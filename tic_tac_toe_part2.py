@@ -1,459 +1,694 @@
 import sys
 import pygame
 from pygame.locals import *
-import pygame_menu
-import random
-
-pygame.init()
+from concurrent.futures import Future, ThreadPoolExecutor
+import tic_tac_toe_core
+from tic_tac_toe_engine import iter_moves, standard_geometry
+from tic_tac_toe_core import Player, window_length
+from tic_tac_toe_ai import AI
+from tic_tac_toe_stats import SearchStats
+from tic_tac_toe_records import GameLog, GameRecord, default_log_path, opponents
+from tic_tac_toe_strategies import get_strategies, get_strategy, warm_up_strategies
+from tic_tac_toe_index import get_index
+from tic_tac_toe_ponder import Ponderer
+import tic_tac_toe_ultimate
+from tic_tac_toe_ultimate import UltimateAI, board_masks, cell_size, small_board_length
+
+# pygame, the fonts and the window are only set up when the game starts
+# so importing this module doesn't open a window
+# (the game logic is in tic_tac_toe_core.py, which doesn't need pygame at all)
 
 # determine the sizes
-square_size = 150
+# the window stays about the same size whatever the board size
+square_size = window_length // 3
 width = square_size * 3
 height = square_size * 3
 window_size = (width, height)
 
-# font for displaying the marks
-font_size = square_size * 80 // 100
-font = pygame.font.Font(pygame.font.get_default_font(), font_size)
+# the game window, once it's open
+game_window = None
 
-# create the game window
-game_window = pygame.display.set_mode(window_size)
-pygame.display.set_caption('Tic Tac Toe')
+def open_window(size=window_size):
 
-class Square:
+    # start pygame and open the window, or resize it if it's already open
+    global game_window
+    if not pygame.get_init():
+        pygame.init()
+    if game_window is None or game_window.get_size() != size:
+        game_window = pygame.display.set_mode(size)
+        pygame.display.set_caption('Tic Tac Toe')
+    return game_window
 
-    def __init__(self, row, col):
-        self.row = row
-        self.col = col
-        self.mark = None
+# fonts for displaying the marks, one for each square size
+# made when they're first needed
+fonts = dict()
 
-    def draw(self):
-        if self.mark is not None:
-            white = (255, 255, 255)
-            text = font.render(self.mark, True, white)
-            text_rect = text.get_rect()
-            center_x = self.col * square_size + square_size // 2
-            center_y = self.row * square_size + square_size // 2
-            text_rect.center = (center_x, center_y)
-            game_window.blit(text, text_rect)
+def get_font(square_size):
+    if square_size not in fonts:
+        font_size = square_size * 80 // 100
+        fonts[square_size] = pygame.font.Font(pygame.font.get_default_font(), font_size)
+    return fonts[square_size]
 
-class Board:
+# the game loop doesn't run faster than this
+frame_rate = 30
 
-    def __init__(self):
+# the AI looks like it's thinking for at least this many milliseconds
+# even when it finds its move sooner
+ai_min_display_time = 3000
 
-        # create a dictionary of squares
-        # key will be a (row, col) tuple
-        # value is a square object
-        self.squares = dict()
+# the finished game stays on the screen this long before the results show up
+game_over_display_time = 3000
 
-        # create a blank board
-        self.create_new_board()
+# show how fast the smart AI is searching in the title
+# (run the game with --debug to turn it on)
+debug = False
 
-    def create_new_board(self):
+# every game played is added to this log (see tic_tac_toe_records.py)
+# set it to None to not keep a log
+game_log_path = default_log_path
 
-        # create 3 rows and 3 cols
-        for row in range(3):
-            for col in range(3):
-                # add an empty square
-                self.squares[(row, col)] = Square(row, col)
+# the opponent is 'human' or the name of a strategy
+# strategies from other packages aren't logged, the log only has room for the built in ones
+def log_game(size, win_length, first_mark, opponent_type, outcome, moves):
+    if game_log_path is not None and opponent_type in opponents:
+        with GameLog(game_log_path) as log:
+            log.write(GameRecord(size, win_length, first_mark, opponent_type, outcome, moves))
 
-        # for highlighting the squares after winning
-        self.winning_squares = []
+# the AI thinks in this thread, so the window keeps working while it does
+ai_executor = ThreadPoolExecutor(max_workers=1)
 
-    def draw(self):
+# while the player decides, an AI whose strategy ponders searches its replies
+# to the player's likely moves, using at most this share of a core
+# a reply that's ready is played straight away (set it to 0 to not ponder)
+ponder_cpu_share = 0.5
 
-        # draw the background
-        green = (94, 173, 106)
-        game_window.fill(green)
+# seconds the AI thinks for in ultimate tic tac toe
+ultimate_time_limit = 1
 
-        # highlight the winning squares
-        yellow = (228, 235, 134)
-        for square in self.winning_squares:
-            rect_x = square.col * square_size
-            rect_y = square.row * square_size
-            rect = Rect(rect_x, rect_y, square_size, square_size)
-            pygame.draw.rect(game_window, yellow, rect)
+# the X and O images are only rendered once for each square size
+glyphs = dict()
+
+def get_glyph(mark, square_size):
+    if (mark, square_size) not in glyphs:
+        white = (255, 255, 255)
+        glyphs[(mark, square_size)] = get_font(square_size).render(mark, True, white).convert_alpha()
+    return glyphs[(mark, square_size)]
+
+# the background with the lines is only drawn once for each board size
+# (a yellow one for highlighting the winning squares and a green one for the rest)
+backgrounds = dict()
+
+def get_background(size, square_size, highlighted):
+
+    if (size, square_size, highlighted) not in backgrounds:
+
+        width = square_size * size
+        height = square_size * size
+        background = pygame.Surface((width, height)).convert()
+
+        # draw the background
+        if highlighted:
+            yellow = (228, 235, 134)
+            background.fill(yellow)
+        else:
+            green = (94, 173, 106)
+            background.fill(green)
 
         # draw the lines
         black = (0, 0, 0)
-        for i in range(3):
+        for i in range(size):
 
             # vertical lines
             start_pos = (i * square_size, 0)
             end_pos = (i * square_size, height)
-            pygame.draw.line(game_window, black, start_pos, end_pos)
+            pygame.draw.line(background, black, start_pos, end_pos)
 
             # horizontal lines
             start_pos = (0, i * square_size)
             end_pos = (width, i * square_size)
-            pygame.draw.line(game_window, black, start_pos, end_pos)
-
-            # draw the squares
-            for row, col in self.squares:
-                square = self.squares[(row, col)]
-                square.draw()
-
-    def check_row_win(self, row, mark):
-
-        # assume for now that all marks in this row are the same
-        same_marks_in_row = True
-
-        # check if there's a square in the row that doesn't have the same mark
-        for col in range(3):
-            if self.squares[(row, col)].mark != mark:
-                same_marks_in_row = False
-
-        # add the winning squares
-        if same_marks_in_row:
-            for col in range(3):
-                self.winning_squares.append(self.squares[(row, col)])
-
-        return same_marks_in_row
-
-    def check_col_win(self, col, mark):
-
-        # assume for now that all marks in this col are the same
-        same_marks_in_col = True
-
-        # check if there's a square in the col that doesn't have the same mark
-        for row in range(3):
-            if self.squares[(row, col)].mark != mark:
-                same_marks_in_col = False
-
-        # add the winning squares
-        if same_marks_in_col:
-            for row in range(3):
-                self.winning_squares.append(self.squares[(row, col)])
-
-        return same_marks_in_col
-
-    def check_diagonal_win(self, mark):
-
-        # assume for now that all marks in the upper-left to lower-right diagonal are the same
-        same_marks_in_diagonal = True
-
-        # check if there's a square in the diagonal that doesn't have the same mark
-        row = 0
-        col = 0
-        for i in range(3):
-            if self.squares[(row + i, col + i)].mark != mark:
-                same_marks_in_diagonal = False
-
-        # add the winning squares then return True
-        if same_marks_in_diagonal:
-            row = 0
-            col = 0
-            for i in range(3):
-                self.winning_squares.append(self.squares[(row + i, col + i)])
-            return True
-
-        # check the other diagonal direction (lower-left to upper-right)
-        same_marks_in_diagonal = True
-        row = 2
-        col = 0
-        for i in range(3):
-            if self.squares[(row - i, col + i)].mark != mark:
-                same_marks_in_diagonal = False
-
-        # add the winning squares then return True
-        if same_marks_in_diagonal:
-            row = 2
-            col = 0
-            for i in range(3):
-                self.winning_squares.append(self.squares[(row - i, col + i)])
-            return True
-
-        return same_marks_in_diagonal
-
-    def check_winner(self, clicked_square, mark):
-        
-        if self.check_row_win(clicked_square.row, mark):
-            return True
-        elif self.check_col_win(clicked_square.col, mark):
-            return True
-        elif self.check_diagonal_win(mark):
-            return True
-        else:
-            return False
+            pygame.draw.line(background, black, start_pos, end_pos)
 
-    def check_tie(self):
-        
-        # check if there's an open square
-        for row, col in self.squares:
-            if self.squares[(row, col)].mark is None:
-                return False
-        return True
+        backgrounds[(size, square_size, highlighted)] = background
 
-class Player:
+    return backgrounds[(size, square_size, highlighted)]
 
-    def __init__(self, mark):
-        self.mark = mark
+# the dots the hints are drawn with, one for each outcome and square size
+# (green if the move wins, grey if it ties, red if it loses)
+hint_colors = {1: (40, 200, 60), 0: (200, 200, 200), -1: (220, 50, 50)}
+hint_glyphs = dict()
 
-    def move(self, board, click_pos):
+def get_hint_glyph(outcome, square_size):
+    if (outcome, square_size) not in hint_glyphs:
+        radius = square_size // 10
+        glyph = pygame.Surface((radius * 2, radius * 2), SRCALPHA).convert_alpha()
+        pygame.draw.circle(glyph, hint_colors[outcome], (radius, radius), radius)
+        hint_glyphs[(outcome, square_size)] = glyph
+    return hint_glyphs[(outcome, square_size)]
 
-        # get the x,y positions of the mouse click
-        click_x, click_y = click_pos
+class Square(tic_tac_toe_core.Square):
 
-        # get the row and col of the clicked square
-        row = click_y // square_size
-        col = click_x // square_size
+    __slots__ = ()
 
-        # mark the square if it's empty
-        if board.squares[(row, col)].mark is None:
-            board.squares[(row, col)].mark = self.mark
-            return board.squares[(row, col)]
+    def draw(self, square_size=square_size):
+        if self.mark is not None:
+            text = get_glyph(self.mark, square_size)
+            text_rect = text.get_rect()
+            center_x = self.col * square_size + square_size // 2
+            center_y = self.row * square_size + square_size // 2
+            text_rect.center = (center_x, center_y)
+            game_window.blit(text, text_rect)
+
+class Board(tic_tac_toe_core.Board):
+
+    # the mark to show hints for (or None), and the position they were drawn for
+    __slots__ = ('hint_mark', 'hint_position')
+
+    square_class = Square
+
+    def create_new_board(self, size=None, win_length=None):
+        super().create_new_board(size, win_length)
+        self.hint_mark = None
+        self.hint_position = None
+
+    def show_hints(self, mark):
+
+        # show (or hide with None) how every empty square turns out for the mark
+        # with best play, from the position index (only on 3x3)
+        # the empty squares are drawn again when the hints change
+        position = (self.state.x_bits, self.state.o_bits)
+        if mark != self.hint_mark or (mark is not None and position != self.hint_position):
+            self.hint_mark = mark
+            self.hint_position = position
+            self.changed |= self.state.get_empty()
+
+    def get_hints(self):
+
+        # return {square index: outcome} for the empty squares
+        # the index only has 3x3 positions, so it isn't loaded for bigger boards
+        if self.hint_mark is None or self.geometry is not standard_geometry:
+            return dict()
+        mover_bits = self.state.get_bits(self.hint_mark)
+        if self.hint_mark == 'X':
+            other_bits = self.state.o_bits
         else:
-            return None
+            other_bits = self.state.x_bits
+        return {index: outcome for index, (outcome, depth) in get_index().move_outcomes(mover_bits, other_bits).items()}
+
+    def draw(self):
 
-class AI:
+        # only the squares that changed are drawn again
+        # returns the rects that were drawn, for pygame.display.update
+        if not self.changed and not self.redraw_all:
+            return []
+        square_size = self.square_size
+        updated_rects = []
 
-    def __init__(self, mark, strategy):
-        self.mark = mark
-        self.strategy = strategy
+        # draw the background and the lines
+        if self.redraw_all:
+            game_window.blit(get_background(self.size, square_size, False), (0, 0))
+            updated_rects.append(Rect(0, 0, self.width, self.height))
+            self.changed |= self.state.x_bits | self.state.o_bits | self.winning_line
+            self.redraw_all = False
 
-    def get_available_moves(self, board):
+        hints = self.get_hints()
 
-        available_moves = []
+        for index in iter_moves(self.changed):
+            row, col = self.geometry.square_position(index)
+            rect = Rect(col * square_size, row * square_size, square_size, square_size)
 
-        # look at every square on the board
-        for row, col in board.squares:
+            # cover the old square with the background
+            # highlight the winning squares
+            highlighted = self.winning_line & (1 << index) != 0
+            game_window.blit(get_background(self.size, square_size, highlighted), rect, rect)
 
-            # check if square is available
-            if board.squares[(row, col)].mark is None:
-                available_moves.append((row, col))
+            # draw the square, or the hint in the corner of an empty one
+            Square(self, row, col).draw(square_size)
+            if index in hints:
+                margin = square_size // 10
+                game_window.blit(get_hint_glyph(hints[index], square_size), (rect.x + margin, rect.y + margin))
+            updated_rects.append(rect)
 
-        return available_moves
+        self.changed = 0
+        return updated_rects
 
-    def move(self, board):
+# the shade over a small board that's won or full in ultimate tic tac toe
+shades = dict()
 
-        available_moves = self.get_available_moves(board)
+def get_shade(length):
+    if length not in shades:
+        shade = pygame.Surface((length, length), SRCALPHA).convert_alpha()
+        shade.fill((0, 0, 0, 110))
+        shades[length] = shade
+    return shades[length]
 
-        # return None if there are no available moves left
-        if len(available_moves) == 0:
-            return None
+class UltimateBoard(tic_tac_toe_ultimate.UltimateBoard):
 
-        if self.strategy == 'random':
+    __slots__ = ()
 
-            # randomly select a square from the board
-            row, col = random.choice(available_moves)
-            board.squares[(row, col)].mark = self.mark
-            return board.squares[(row, col)]
+    def show_hints(self, mark):
 
-        elif self.strategy == 'smart':
+        # the position index only knows the normal game
+        pass
+
+    def draw(self):
 
-            # score every possible move to determine the best move
-            best_score = None
-            best_move = None
+        # only the small boards that changed are drawn again
+        # (the one a move was played in, and the ones it highlights or stops highlighting)
+        # returns the rects that were drawn, for pygame.display.update
+        if not self.changed_boards and not self.redraw_all:
+            return []
+        updated_rects = []
+
+        # the gaps between the small boards
+        if self.redraw_all:
+            black = (0, 0, 0)
+            game_window.fill(black)
+            updated_rects.append(Rect((0, 0), self.window_size))
+            self.changed_boards = (1 << 9) - 1
+            self.redraw_all = False
+
+        # the small boards the next move can go in are yellow, and so is the winning line
+        state = self.state
+        highlighted = self.highlighted_boards() | self.winning_boards
+
+        for board in iter_moves(self.changed_boards):
+            rect = Rect(self.board_rect(board))
+            game_window.blit(get_background(3, cell_size, highlighted & (1 << board) != 0), rect)
+
+            # the marks in the small board
+            for index in iter_moves((state.x_bits | state.o_bits) & board_masks[board]):
+                square = index % 9
+                text = get_glyph(state.get_mark(index), cell_size)
+                text_rect = text.get_rect()
+                text_rect.center = (rect.x + (square % 3) * cell_size + cell_size // 2,
+                                    rect.y + (square // 3) * cell_size + cell_size // 2)
+                game_window.blit(text, text_rect)
+
+            # a small board that's over is shaded, with a big mark if it was won
+            if state.closed_boards() & (1 << board):
+                game_window.blit(get_shade(small_board_length), rect)
+                if state.x_boards & (1 << board):
+                    mark = 'X'
+                elif state.o_boards & (1 << board):
+                    mark = 'O'
+                else:
+                    mark = None
+                if mark is not None:
+                    text = get_glyph(mark, small_board_length)
+                    game_window.blit(text, text.get_rect(center=rect.center))
+            updated_rects.append(rect)
 
-            # look at every available move
-            for row, col in available_moves:
+        self.changed_boards = 0
+        return updated_rects
 
-                # make the move
-                square = board.squares[(row, col)]
-                square.mark = self.mark
+# the game goes from one screen to the next: menu -> game -> results -> menu ...
+# one loop runs the whole time and every frame hands the events to the current screen
+# so nothing nests, and the board and the menus are made once and used for every game
 
-                # use minimax algorithm to score this move
-                score = self.minimax(board, square, False)
+def make_menu(title, width, height):
 
-                # check if the score is better
-                if best_score is None or score > best_score:
-                    best_score = score
-                    best_move = (row, col)
+    import pygame_menu
+    my_theme = pygame_menu.themes.THEME_BLUE.copy()
+    my_theme.title_font_size = 18
+    my_theme.widget_font_size = 12
+    return pygame_menu.Menu(title, width, height, theme = my_theme)
 
-                # undo the move so we can try a different move in the next iteration
-                square.mark = None
-                board.winning_squares = []
+# the boards to choose from: (size, marks in a row to win)
+board_variants = [
+    ('3x3', (3, 3)),
+    ('4x4', (4, 4)),
+    ('5x5', (5, 4)),
+    ('7x7', (7, 5)),
+    ('15x15', (15, 5)),
+]
 
-            # make the best move
-            board.squares[best_move].mark = self.mark
-            return board.squares[best_move]
+class Game:
 
-    def minimax(self, board, square, is_maximizing):
+    def __init__(self):
 
-        # determine the human player's mark
-        if self.mark == 'X':
-            player_mark = 'O'
-        else:
-            player_mark = 'X'
+        # the one board every game is played on, and one for ultimate tic tac toe
+        self.board = Board()
+        self.ultimate_board = UltimateBoard()
 
-        # return a minimax score of 1 if the move resulted in the AI winning
-        if board.check_winner(square, self.mark):
-            return 1
+        # the screens, and the one being shown (None once the game is closed)
+        self.menu_screen = MenuScreen(self)
+        self.play_screen = PlayScreen(self)
+        self.ultimate_screen = UltimateScreen(self)
+        self.results_screen = ResultsScreen(self)
+        self.screen = None
 
-        # return a minimax score of -1 if the move resulted in the human player winning
-        if board.check_winner(square, player_mark):
-            return -1
+    def show(self, screen, *args):
 
-        # return a minimax score of 0 if the move resulted in a tie
-        if board.check_tie():
-            return 0
+        # go to another screen from the next frame on
+        self.screen = screen
+        screen.start(*args)
 
-        # get list of available moves
-        available_moves = self.get_available_moves(board)
+    def run(self):
 
-        if is_maximizing:
+        # the main loop, until the window is closed
+        clock = pygame.time.Clock()
+        while self.screen is not None:
+            events = pygame.event.get()
+            if any(event.type == QUIT for event in events):
+                self.screen.quit()
+                self.screen = None
+                break
+            self.screen.update(events)
 
-            # what's the best score we can get after the AI makes a move
-            best_score = None
-            for row, col in available_moves:
+            # wait for the next frame
+            clock.tick(frame_rate)
 
-                # AI makes a move
-                square = board.squares[(row, col)]
-                square.mark = self.mark
+        pygame.quit()
 
-                # recursively call minimax to score player's next move
-                score = self.minimax(board, square, False)
+class MenuScreen:
 
-                if best_score is None or score > best_score:
-                    best_score = score
+    def __init__(self, game):
+        self.game = game
+        self.menu = None
 
-                # undo the move
-                square.mark = None
-                board.winning_squares = []
+    def start(self):
 
-            return best_score
+        open_window()
+        if self.menu is None:
+            self.menu = make_menu('Select Opponent', 200, 320)
+            self.board_selector = self.menu.add.selector('Board ', board_variants)
 
+            # a button for every strategy the AI can play with
+            self.menu.add.button('Human', lambda : self.start_game('human'))
+            for name, strategy in get_strategies().items():
+                self.menu.add.button(strategy.label or name, lambda name=name : self.start_game(name))
+
+            # ultimate tic tac toe has a board of its own (the board selector doesn't apply)
+            self.menu.add.button('Ultimate - Human', lambda : self.game.show(self.game.ultimate_screen, 'human'))
+            self.menu.add.button('Ultimate - AI', lambda : self.game.show(self.game.ultimate_screen, 'ultimate'))
+        pygame.display.set_caption('Tic Tac Toe')
+
+    def start_game(self, opponent_type):
+        (label, (size, win_length)), index = self.board_selector.get_value()
+        self.game.show(self.game.play_screen, opponent_type, size, win_length)
+
+    def update(self, events):
+        self.menu.update(events)
+        if self.game.screen is self:
+            self.menu.draw(game_window)
+            pygame.display.update()
+
+    def quit(self):
+        pass
+
+class ResultsScreen:
+
+    def __init__(self, game):
+        self.game = game
+        self.menu = None
+
+    def start(self, msg):
+
+        if self.menu is None:
+            self.menu = make_menu('Game over', 150, 150)
+            self.label = self.menu.add.label(msg)
+            self.menu.add.vertical_margin(30)
+            self.menu.add.button('Play Again', lambda : self.game.show(self.game.menu_screen))
         else:
+            self.label.set_title(msg)
 
-            # what's the worst score we can get after the human player makes a move
-            worst_score = None
-            for row, col in available_moves:
+        # in the middle of the window, whatever size the last board made it
+        self.menu.resize(150, 150, screen_dimension=game_window.get_size())
 
-                # player makes a move
-                square = board.squares[(row, col)]
-                square.mark = player_mark
+    def update(self, events):
+        self.menu.update(events)
+        if self.game.screen is self:
+            self.menu.draw(game_window)
+            pygame.display.update()
 
-                # recursively call minimax to score AI's next move
-                score = self.minimax(board, square, True)
+    def quit(self):
+        pass
 
-                if worst_score is None or score < worst_score:
-                    worst_score = score
+class PlayScreen:
 
-                # undo the move
-                square.mark = None
-                board.winning_squares = []
+    def __init__(self, game):
+        self.game = game
+        self.board = game.board
 
-            return worst_score
+        # games started on this screen, so the players can take turns going first
+        self.games = 0
 
-def display_results(msg):
+    def start(self, opponent_type = 'human', size = 3, win_length = 3, ai_delay = ai_min_display_time):
 
-    my_theme = pygame_menu.themes.THEME_BLUE
-    my_theme.title_font_size = 18
-    my_theme.widget_font_size = 12
-    results_popup = pygame_menu.Menu('Game over', 150, 150, theme = my_theme)
-    results_popup.add.label(msg)
-    results_popup.add.vertical_margin(30)
-    results_popup.add.button('Play Again', select_opponent_menu)
-    results_popup.mainloop(game_window)
+        # clear the board
+        self.board.create_new_board(size, win_length)
+        self.new_game(opponent_type, ai_delay)
 
-def select_opponent_menu():
+    def make_ai(self, opponent_type):
 
-    my_theme = pygame_menu.themes.THEME_BLUE
-    my_theme.title_font_size = 18
-    my_theme.widget_font_size = 12
-    opponent_selection = pygame_menu.Menu('Select Opponent', 200, 200, theme = my_theme)
-    opponent_selection.add.button('Human', run_game)
-    opponent_selection.add.button('AI - Random', lambda : run_game('AI - Random'))
-    opponent_selection.add.button('AI - Smart', lambda : run_game('AI - Smart'))
-    opponent_selection.mainloop(game_window)
+        # an AI playing the strategy with that name, with the settings it wants for the board
+        # and stats for the title when the game is run with --debug
+        if debug:
+            stats = SearchStats()
+        else:
+            stats = None
+        return AI('O', opponent_type, stats=stats, **get_strategy(opponent_type).game_options(self.board.size))
 
-def run_game(opponent_type = 'human'):
+    def new_game(self, opponent_type, ai_delay):
 
-    # create the board
-    board = Board()
+        # open the window, or resize it if the board needs a different size
+        open_window(self.board.window_size)
 
-    # create the players
-    player = Player('X')
+        # create the players
+        self.player = Player('X')
+        self.opponent_type = opponent_type
 
-    if opponent_type == 'human':
-        opponent = Player('O')
-    elif opponent_type == 'AI - Random':
-        opponent = AI('O', 'random')
-    elif opponent_type == 'AI - Smart':
-        opponent = AI('O', 'smart')
+        if opponent_type == 'human':
+            self.opponent = Player('O')
+        else:
+            self.opponent = self.make_ai(opponent_type)
 
-    # randomly select who goes first
-    current_player = random.choice([player, opponent])
+        # take turns going first: the player in the first game, the opponent in the next one ...
+        if self.games % 2 == 0:
+            self.current_player = self.player
+        else:
+            self.current_player = self.opponent
+        self.games += 1
+
+        # the squares played so far, for the game log
+        self.first_mark = self.current_player.mark
+        self.moves = []
+
+        # game status (playing, winner, or tie), and when the game ended
+        self.game_status = 'playing'
+        self.game_over_time = 0
+
+        # the AI's move while it's thinking, when it started thinking
+        # and how long it looks like it's thinking for
+        self.ai_move = None
+        self.ai_start_time = 0
+        self.ai_delay = ai_delay
+
+        # press H to show which squares win, tie or lose for the player (3x3 only)
+        self.hints = False
+
+        # the AI thinking about its replies while it's the player's turn
+        # and whether the move the AI is making was found that way
+        self.ponderer = None
+        self.pondered = False
+
+    def stop_pondering(self):
+
+        # stop the AI thinking about its replies, return what it found (or None)
+        ponderer = self.ponderer
+        if ponderer is not None:
+            ponderer.stop()
+            self.ponderer = None
+        return ponderer
+
+    def quit(self):
+
+        # don't wait for the AI to finish thinking
+        self.stop_pondering()
+        if type(self.opponent) != Player:
+            self.opponent.stop()
+
+        # keep the game that was being played in the log
+        if self.game_status == 'playing' and self.moves:
+            self.log('unfinished')
+
+    def log(self, outcome):
+        log_game(self.board.size, self.board.win_length, self.first_mark, self.opponent_type, outcome, self.moves)
+
+    def play_square(self, square):
+
+        # after a square was marked: update the game status if there's a winner or if it's a tie
+        # otherwise switch players
+        board = self.board
+        self.moves.append(square.index)
+        winning_line = board.get_winning_line(square, self.current_player.mark)
+        if winning_line is not None:
+            board.record_win(winning_line)
+            self.game_status = 'winner'
+        elif board.check_tie():
+            self.game_status = 'tie'
+        else:
+            if self.current_player == self.player:
+                self.current_player = self.opponent
+            else:
+                self.current_player = self.player
+
+        # log the game as soon as it's over
+        if self.game_status == 'winner':
+            outcome = self.current_player.mark
+        elif self.game_status == 'tie':
+            outcome = 'tie'
+        else:
+            return
+        self.log(outcome)
+        self.game_over_time = pygame.time.get_ticks()
+
+    def update(self, events):
 
-    # game status (playing, winner, or tie)
-    game_status = 'playing'
+        board = self.board
+        current_player = self.current_player
 
-    # game loop
-    while True:
+        for event in events:
 
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
+            if event.type == KEYDOWN and event.key == K_h:
+                self.hints = not self.hints
 
             # check for mouse click
-            if event.type == MOUSEBUTTONDOWN and type(current_player) == Player:
+            if event.type == MOUSEBUTTONDOWN and type(current_player) == Player and self.game_status == 'playing':
 
                 # fill the square that was clicked
-                square = current_player.move(board, pygame.mouse.get_pos())
+                square = current_player.move(board, event.pos)
 
                 # check if clicking the square was successful
                 if square is not None:
+                    ponderer = self.stop_pondering()
+                    self.play_square(square)
+                    current_player = self.current_player
+
+                    # play the AI's reply straight away if it was found while pondering
+                    if ponderer is not None and type(current_player) == AI and self.game_status == 'playing':
+                        reply = ponderer.reply(square.index)
+                        if reply is not None:
+                            self.ai_move = Future()
+                            self.ai_move.set_result(reply)
+                            self.ai_start_time = pygame.time.get_ticks() - self.ai_delay
+                            self.pondered = True
+
+        # the hints are for the player whose turn it is
+        if self.hints and type(current_player) == Player and self.game_status == 'playing':
+            board.show_hints(current_player.mark)
+        else:
+            board.show_hints(None)
 
-                    # update the game status if there's a winner or if it's a tie
-                    # otherwise switch players
-                    if board.check_winner(square, current_player.mark):
-                        game_status = 'winner'
-                    elif board.check_tie():
-                        game_status = 'tie'
-                    else:
-                        if current_player == player:
-                            current_player = opponent
-                        else:
-                            current_player = player
-
-        board.draw()
-        pygame.display.update()
-
-        # AI's move
-        if type(current_player) == AI:
+        # draw the squares that changed
+        pygame.display.update(board.draw())
 
-            # display in the title who the current player is
-            pygame.display.set_caption(f"Tic Tac Toe - AI's move")
+        # if there's a winner or a tie
+        # leave the board up for a few seconds, then display the results
+        if self.game_status != 'playing':
+            if pygame.time.get_ticks() - self.game_over_time >= game_over_display_time:
+                if self.game_status == 'winner':
+                    self.game.show(self.game.results_screen, f'Player {current_player.mark} wins!')
+                else:
+                    self.game.show(self.game.results_screen, "It's a Tie!")
+            return
 
-            # wait 3 seconds then AI makes its move
-            pygame.time.wait(3000)
-            square = current_player.move(board)
+        # AI's move
+        if type(current_player) != Player:
 
-            # check if the AI successfully selected a square
-            if square is not None:
+            # start the AI thinking in the background
+            # it works on a copy of the board, so drawing the board can't be affected
+            if self.ai_move is None:
+                self.ai_move = ai_executor.submit(current_player.choose_move, board.state.copy())
+                self.ai_start_time = pygame.time.get_ticks()
+                self.pondered = False
+            ai_move = self.ai_move
 
-                # update the game status if there's a winner or if it's a tie
-                # otherwise switch players
-                if board.check_winner(square, current_player.mark):
-                    game_status = 'winner'
-                elif board.check_tie():
-                    game_status = 'tie'
+            # display in the title who the current player is
+            # with dots that keep moving while the AI thinks
+            thinking_time = pygame.time.get_ticks() - self.ai_start_time
+            dots = '.' * (thinking_time // 500 % 4)
+            caption = f"Tic Tac Toe - AI's move{dots}"
+
+            # and how fast it's searching, or how fast it searched once it's done
+            if self.pondered:
+                caption += ' [pondered]'
+            elif current_player.stats is not None:
+                if ai_move.done():
+                    move_stats = current_player.stats.last_move()
+                    nodes = move_stats['nodes']
+                    nodes_per_sec = move_stats['nodes_per_sec']
+                    depth = move_stats['depth']
                 else:
-                    if current_player == player:
-                        current_player = opponent
-                    else:
-                        current_player = player
+                    nodes = current_player.nodes
+                    nodes_per_sec = nodes * 1000 / max(thinking_time, 1)
+                    depth = current_player.depth
+                caption += f' [{nodes} nodes, {nodes_per_sec:.0f} nodes/s, depth {depth}]'
+
+            pygame.display.set_caption(caption)
 
-                # redraw the board
-                board.draw()
-                pygame.display.update()
+            # the AI makes its move once it's done thinking and has been thinking long enough
+            if ai_move.done() and thinking_time >= self.ai_delay:
+                index = ai_move.result()
+                self.ai_move = None
+                if index is not None:
+                    row, col = board.geometry.square_position(index)
+                    self.play_square(board.mark_square(row, col, current_player.mark))
 
-                # clear events in case the player clicks on the board during AI's move
-                pygame.event.clear()
+                    # redraw the board
+                    pygame.display.update(board.draw())
 
         else:
             # display in the title who the current player is
             pygame.display.set_caption(f"Tic Tac Toe - Player {current_player.mark}'s move")
 
-        # if there's a winner or a tie
-        # wait 3 seconds, then display the results
-        if game_status == 'winner':
-            pygame.time.wait(3000)
-            display_results(f'Player {current_player.mark} wins!')
-        elif game_status == 'tie':
-            pygame.time.wait(3000)
-            display_results("It's a Tie!")
+            # let the AI think about its replies in the meantime
+            opponent = self.opponent
+            if (self.ponderer is None and ponder_cpu_share > 0 and type(opponent) == AI
+                    and opponent.engine.ponders):
+                self.ponderer = Ponderer(opponent, board.state, ponder_cpu_share)
+                self.ponderer.start(ai_executor)
+
+class UltimateScreen(PlayScreen):
+
+    # a game of ultimate tic tac toe (see tic_tac_toe_ultimate.py)
+    # it's played like the normal game, on a board of its own and against an AI of its own
+    def __init__(self, game):
+        super().__init__(game)
+        self.board = game.ultimate_board
+
+    def start(self, opponent_type = 'human', ai_delay = ai_min_display_time):
+        self.board.create_new_board()
+        self.new_game(opponent_type, ai_delay)
+
+    def make_ai(self, opponent_type):
+        return UltimateAI('O', ultimate_time_limit)
+
+    def log(self, outcome):
+
+        # the game log only has room for the normal boards
+        pass
+
+def select_opponent_menu():
+
+    # start the game at the menu
+    game = Game()
+    game.show(game.menu_screen)
+    game.run()
+
+def run_game(opponent_type = 'human', size = 3, win_length = 3, ai_delay = ai_min_display_time):
+
+    # start the game with a game against opponent_type
+    game = Game()
+    game.show(game.play_screen, opponent_type, size, win_length, ai_delay)
+    game.run()
 
 if __name__ == '__main__':
-    select_opponent_menu()
\ No newline at end of file
+
+    debug = '--debug' in sys.argv
+
+    # map the opening book into memory and load whatever else the strategies need
+    # before the first game
+    warm_up_strategies()
+
+    select_opponent_menu()
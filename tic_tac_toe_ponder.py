@@ -0,0 +1,122 @@
+# pondering: the AI thinks about its reply while the other player decides
+#
+# while it's the player's turn, the AI searches its reply to every move the
+# player is likely to make, the best looking moves first, and keeps the results
+# when the player moves, the reply to that move is usually ready straight away
+#
+#   ponderer = Ponderer(ai, state)
+#   ponderer.start(executor)
+#   ... the player moves ...
+#   ponderer.stop()
+#   index = ponderer.reply(move)     # None if that move wasn't searched in time
+#
+# it searches in the executor's thread with the AI itself (so it shares the
+# AI's transposition table), so the AI can't be used for anything else until
+# stop() returns
+# cpu_share keeps it from using more than that share of a core: after every
+# search it rests for as long as it has to
+# (a share of the cores the search runs on, if it's split over more than one)
+
+import threading
+import time
+from concurrent.futures import wait
+from tic_tac_toe_engine import iter_moves
+
+class Ponderer:
+
+    def __init__(self, ai, state, cpu_share=0.5, max_seconds=None, max_moves=None):
+        self.ai = ai
+        if ai.mark == 'X':
+            self.player_mark = 'O'
+        else:
+            self.player_mark = 'X'
+
+        # a copy of the position with the player to move
+        self.state = state.copy()
+
+        # the share of a core it can use, seconds it can think for in total
+        # and how many of the player's moves it looks at (None for no limit)
+        self.cpu_share = cpu_share
+        self.max_seconds = max_seconds
+        self.max_moves = max_moves
+
+        # the player's move -> the AI's reply, for every reply that was searched to the end
+        self.replies = dict()
+        self.seconds = 0
+
+        self.future = None
+        self.cancelled = threading.Event()
+
+    def likely_moves(self):
+
+        # the player's moves, most likely first
+        # a move that wins comes first, then the moves that look best for the player
+        # the way the AI scores a position it stopped searching at
+        state = self.state
+        geometry = state.geometry
+        ai_bits = state.get_bits(self.ai.mark)
+        player_bits = state.get_bits(self.player_mark)
+
+        def key(index):
+            new_bits = player_bits | (1 << index)
+            wins = geometry.is_winning_move(new_bits, index)
+            return (not wins, -self.ai.evaluate(geometry, new_bits, ai_bits), geometry.move_rank[index])
+
+        moves = sorted(iter_moves(geometry.candidate_moves(state.x_bits | state.o_bits)), key=key)
+        if self.max_moves is not None:
+            moves = moves[:self.max_moves]
+        return moves
+
+    def start(self, executor):
+        self.future = executor.submit(self.run)
+        return self.future
+
+    def run(self):
+
+        ai = self.ai
+        player_mark = self.player_mark
+        for index in self.likely_moves():
+            if self.cancelled.is_set():
+                break
+            if self.max_seconds is not None and self.seconds >= self.max_seconds:
+                break
+
+            # the position after the player's move, unless it ends the game
+            state = self.state.copy()
+            state.place(index, player_mark)
+            if state.is_winning_move(index, player_mark) or state.is_full():
+                continue
+
+            start_time = time.perf_counter()
+            reply = ai.select_move(state)
+            seconds = time.perf_counter() - start_time
+            self.seconds += seconds
+
+            # a search that was stopped part way through isn't kept
+            if self.cancelled.is_set():
+                break
+            self.replies[index] = reply
+
+            # rest so the thread uses no more than cpu_share of a core
+            if self.cpu_share < 1:
+                self.cancelled.wait(seconds * (1 - self.cpu_share) / self.cpu_share)
+
+    def stop(self):
+
+        # stop thinking and wait for the thread to finish
+        # the AI is asked to stop until it has, in case it was just starting a search
+        # (starting a search clears an earlier stop)
+        self.cancelled.set()
+        if self.future is None:
+            return
+        while not self.future.done():
+            self.ai.stop()
+            wait([self.future], timeout=0.01)
+
+        # raise anything that went wrong while it was thinking
+        self.future.result()
+
+    def reply(self, index):
+
+        # the AI's reply to the player's move, or None if it wasn't searched
+        return self.replies.get(index)
@@ -0,0 +1,365 @@
+# a log of played games, a few bytes per game
+#
+#   python tic_tac_toe_records.py stats games.log
+#   python tic_tac_toe_records.py replay games.log --game 10
+#   python tic_tac_toe_records.py export games.log games.jsonl
+#   python tic_tac_toe_records.py import games.jsonl games.log
+#
+# the game appends every game it plays to tic_tac_toe_games.log
+# reading a log goes through mmap, so a log of millions of games is read
+# one game at a time without loading the whole file
+#
+# file layout:
+#   magic    4 bytes   b'TTTG'
+#   version  2 bytes   (little endian)
+#   unused   2 bytes
+#   then one record per game, each one:
+#     board       1 byte    board size in the high 4 bits, marks in a row to win in the low 4
+#     flags       1 byte    outcome in bits 0-1, first player in bit 2 (0 X, 1 O)
+#                           and opponent in bits 3-4
+#     moves       1 byte    number of moves
+#     squares     the square index of each move in order
+#                 (the players take turns, starting with the first player)
+#                 boards with up to 16 squares use half a byte per move (the
+#                 first move in the low half), bigger boards a byte per move
+#
+# so a 3x3 game takes 5 to 8 bytes
+# a record that was cut off (the game crashed while writing it) is ignored, and
+# dropped the next time the log is opened for writing so the next game doesn't
+# end up after it
+
+import argparse
+import json
+import mmap
+import os
+import struct
+
+magic = b'TTTG'
+version = 1
+header = struct.Struct('<4sHH')
+record_header = struct.Struct('<BBB')
+
+outcomes = ('X', 'O', 'tie', 'unfinished')
+opponents = ('human', 'random', 'smart', 'mcts')
+
+default_log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tic_tac_toe_games.log')
+
+def is_packed(size):
+
+    # two moves in a byte
+    return size * size <= 16
+
+def moves_length(size, num_moves):
+
+    # bytes taken by the squares of a record
+    if is_packed(size):
+        return (num_moves + 1) // 2
+    return num_moves
+
+def pack_moves(size, moves):
+    if not is_packed(size):
+        return bytes(moves)
+    packed = bytearray(moves_length(size, len(moves)))
+    for number, index in enumerate(moves):
+        packed[number // 2] |= index << (number % 2 * 4)
+    return bytes(packed)
+
+# the two moves in each packed byte, low half first
+unpacked_pairs = [bytes((byte & 15, byte >> 4)) for byte in range(256)]
+
+def unpack_moves(size, data, num_moves):
+    if not is_packed(size):
+        return bytes(data)
+    return b''.join([unpacked_pairs[byte] for byte in data])[:num_moves]
+
+class GameRecord:
+
+    __slots__ = ('size', 'win_length', 'first_mark', 'opponent', 'outcome', 'moves')
+
+    def __init__(self, size=3, win_length=3, first_mark='X', opponent='human', outcome='unfinished', moves=b''):
+        self.size = size
+        self.win_length = win_length
+
+        # the mark that moved first
+        self.first_mark = first_mark
+
+        # one of opponents and one of outcomes
+        self.opponent = opponent
+        self.outcome = outcome
+
+        # the square index of every move, in order
+        self.moves = bytes(moves)
+
+    def marked_moves(self):
+
+        # yield (index, mark) for every move
+        mark = self.first_mark
+        for index in self.moves:
+            yield index, mark
+            if mark == 'X':
+                mark = 'O'
+            else:
+                mark = 'X'
+
+    def to_bytes(self):
+        flags = outcomes.index(self.outcome) | (self.first_mark == 'O') << 2 | opponents.index(self.opponent) << 3
+        board = self.size << 4 | self.win_length
+        return record_header.pack(board, flags, len(self.moves)) + pack_moves(self.size, self.moves)
+
+    def to_dict(self):
+        return {
+            'size': self.size,
+            'win_length': self.win_length,
+            'first_mark': self.first_mark,
+            'opponent': self.opponent,
+            'outcome': self.outcome,
+            'moves': list(self.moves),
+        }
+
+def decode_flags(flags):
+
+    # return (outcome, first mark, opponent)
+    if flags & 4:
+        first_mark = 'O'
+    else:
+        first_mark = 'X'
+    return outcomes[flags & 3], first_mark, opponents[flags >> 3 & 3]
+
+# the logs this process has already checked for a record that was cut off
+# (it only writes whole ones after that, so a log is only read through once)
+checked_paths = set()
+
+class GameLog:
+
+    def __init__(self, path=default_log_path):
+
+        # games are only ever added to the end of the file
+        # raises ValueError if the file is there but isn't a game log
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() < header.size:
+            self.file.truncate(0)
+            self.file.write(header.pack(magic, version, 0))
+            self.file.flush()
+        elif path not in checked_paths:
+
+            # cut off the last record if the game crashed while writing it
+            # (every record after it would be read from the wrong place)
+            try:
+                length = complete_length(path)
+            except ValueError:
+                self.file.close()
+                raise
+            if length < self.file.tell():
+                self.file.truncate(length)
+        checked_paths.add(path)
+
+    def write(self, record):
+
+        # flushed after every game, so a crash loses at most the game being played
+        self.file.write(record.to_bytes())
+        self.file.flush()
+
+    def write_many(self, records):
+        self.file.writelines(record.to_bytes() for record in records)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_log(path):
+
+    # return the log file memory-mapped, or None if it's empty
+    # raises ValueError if it isn't a game log
+    with open(path, 'rb') as log_file:
+        if os.fstat(log_file.fileno()).st_size == 0:
+            return None
+        data = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(data) < header.size:
+        data.close()
+        raise ValueError(f'{path} is not a game log')
+    file_magic, file_version, unused = header.unpack_from(data)
+    if file_magic != magic or file_version != version:
+        data.close()
+        raise ValueError(f'{path} is not a version {version} game log')
+    return data
+
+def iter_raw_records(data):
+
+    # yield (offset of the moves, size, win_length, flags, number of moves) for every record
+    # without making any objects for the moves
+    offset = header.size
+    end = len(data)
+    unpack_from = record_header.unpack_from
+    while offset + record_header.size <= end:
+        board, flags, num_moves = unpack_from(data, offset)
+        size = board >> 4
+        win_length = board & 15
+        moves_offset = offset + record_header.size
+        offset = moves_offset + moves_length(size, num_moves)
+        if offset > end:
+            break
+        yield moves_offset, size, win_length, flags, num_moves
+
+def complete_length(path):
+
+    # the length of the log up to the end of its last whole record
+    data = open_log(path)
+    try:
+        length = header.size
+        for moves_offset, size, win_length, flags, num_moves in iter_raw_records(data):
+            length = moves_offset + moves_length(size, num_moves)
+        return length
+    finally:
+        data.close()
+
+def iter_records(path=default_log_path):
+
+    # yield a GameRecord for every game in the log, one at a time
+    data = open_log(path)
+    if data is None:
+        return
+    try:
+        for moves_offset, size, win_length, flags, num_moves in iter_raw_records(data):
+            outcome, first_mark, opponent = decode_flags(flags)
+            moves = data[moves_offset:moves_offset + moves_length(size, num_moves)]
+            yield GameRecord(size, win_length, first_mark, opponent, outcome, unpack_moves(size, moves, num_moves))
+    finally:
+        data.close()
+
+def log_stats(path=default_log_path):
+
+    # count the outcomes for every board and opponent, and the game lengths
+    # {(size, win_length, opponent): {'X': n, 'O': n, 'tie': n, 'unfinished': n}}
+    counts = dict()
+    games = 0
+    moves = 0
+    data = open_log(path)
+    if data is None:
+        return {'games': 0, 'moves': 0, 'outcomes': counts}
+
+    # count flags bytes first, and only turn them into names at the end
+    flag_counts = dict()
+    try:
+        for moves_offset, size, win_length, flags, num_moves in iter_raw_records(data):
+            key = (size, win_length, flags)
+            flag_counts[key] = flag_counts.get(key, 0) + 1
+            games += 1
+            moves += num_moves
+    finally:
+        data.close()
+
+    for (size, win_length, flags), count in flag_counts.items():
+        outcome, first_mark, opponent = decode_flags(flags)
+        outcome_counts = counts.setdefault((size, win_length, opponent), dict.fromkeys(outcomes, 0))
+        outcome_counts[outcome] += count
+    return {'games': games, 'moves': moves, 'outcomes': counts}
+
+def export_json_lines(log_path, json_path):
+
+    # write every game as one line of JSON
+    with open(json_path, 'w') as json_file:
+        for record in iter_records(log_path):
+            json_file.write(json.dumps(record.to_dict()) + '\n')
+
+def import_json_lines(json_path, log_path):
+
+    # add every game in a JSON lines file (like export_json_lines writes) to a log
+    def read_records():
+        with open(json_path) as json_file:
+            for line in json_file:
+                if line.strip():
+                    game = json.loads(line)
+                    yield GameRecord(game['size'], game['win_length'], game['first_mark'], game['opponent'],
+                                     game['outcome'], game['moves'])
+
+    with GameLog(log_path) as log:
+        log.write_many(read_records())
+
+def replay(path=default_log_path, first_game=0, games=None, move_delay=500):
+
+    # play the games back in the game window, move by move
+    import pygame
+    from pygame.locals import QUIT
+    from tic_tac_toe_part2 import Board, open_window
+
+    for game_number, record in enumerate(iter_records(path)):
+        if game_number < first_game:
+            continue
+        if games is not None and game_number >= first_game + games:
+            break
+
+        board = Board(record.size, record.win_length)
+        open_window(board.window_size)
+        pygame.display.set_caption(f'Tic Tac Toe - Replay of game {game_number} ({record.opponent})')
+        pygame.display.update(board.draw())
+
+        square = None
+        for index, mark in record.marked_moves():
+            pygame.time.wait(move_delay)
+            if any(event.type == QUIT for event in pygame.event.get()):
+                pygame.quit()
+                return
+            row, col = board.geometry.square_position(index)
+            square = board.mark_square(row, col, mark)
+            pygame.display.update(board.draw())
+
+        # highlight the winning squares
+        if record.outcome in ('X', 'O') and square is not None:
+            winning_line = board.get_winning_line(square, record.outcome)
+            if winning_line is not None:
+                board.record_win(winning_line)
+        pygame.display.set_caption(f'Tic Tac Toe - Replay of game {game_number}: {record.outcome}')
+        pygame.display.update(board.draw())
+        pygame.time.wait(move_delay * 3)
+
+    pygame.quit()
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Look at, replay, export and import game logs.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stats_parser = commands.add_parser('stats', help='count the outcomes in a log')
+    stats_parser.add_argument('log', nargs='?', default=default_log_path)
+
+    replay_parser = commands.add_parser('replay', help='play games from a log back in a window')
+    replay_parser.add_argument('log', nargs='?', default=default_log_path)
+    replay_parser.add_argument('--game', type=int, default=0, help='number of the first game to replay')
+    replay_parser.add_argument('--games', type=int, default=None, help='how many games to replay')
+    replay_parser.add_argument('--delay', type=int, default=500, help='milliseconds between moves')
+
+    export_parser = commands.add_parser('export', help='write a log as JSON lines')
+    export_parser.add_argument('log')
+    export_parser.add_argument('json')
+
+    import_parser = commands.add_parser('import', help='add the games in a JSON lines file to a log')
+    import_parser.add_argument('json')
+    import_parser.add_argument('log')
+
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        stats = log_stats(args.log)
+        print(f"{stats['games']} games, {stats['moves']} moves")
+        for (size, win_length, opponent), counts in sorted(stats['outcomes'].items()):
+            total = sum(counts.values())
+            print(f'  {size}x{size} ({win_length} in a row) against {opponent}: {total} games')
+            for outcome, count in counts.items():
+                print(f'    {outcome:<10} {count:>10} ({count / total:.1%})')
+    elif args.command == 'replay':
+        replay(args.log, args.game, args.games, args.delay)
+    elif args.command == 'export':
+        export_json_lines(args.log, args.json)
+    elif args.command == 'import':
+        import_json_lines(args.json, args.log)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+# play tic tac toe over the network
+#
+#   python tic_tac_toe_server.py --port 8765
+#
+# every message is one line of text, with the words separated by spaces
+#
+# client to server:
+#   PLAY human|strategy [size win_length]       start a game against the next
+#                                               player who asks for the same board,
+#                                               or against the AI with that strategy
+#                                               (random, smart, mcts or one from a plugin)
+#   MOVE row col                                mark a square
+#   QUIT                                        close the connection
+#
+# server to client:
+#   WAIT                       waiting for another player to join
+#   START mark size win_length the game started and you play mark (X goes first)
+#   TURN                       it's your move
+#   MOVED mark row col         someone marked a square (you or your opponent)
+#   WIN mark                   the game is over and mark won
+#   TIE                        the game is over and it's a tie
+#   LEFT                       your opponent disconnected, the game is over
+#   ERROR message              the last message was wrong, nothing changed
+#
+# after a game is over the client can send PLAY again
+# the smart AI thinks in a pool of processes, so the server keeps answering
+# everyone else while it searches
+
+import argparse
+import asyncio
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from tic_tac_toe_engine import GameState, get_geometry
+from tic_tac_toe_core import Board
+from tic_tac_toe_strategies import get_strategy
+
+max_board_size = 15
+
+# the AI players of each worker process, made the first time they're needed
+worker_ais = dict()
+
+def choose_ai_move(strategy, mark, x_bits, o_bits, size, win_length):
+
+    # runs in a worker process: return the index of the AI's move
+    from tic_tac_toe_ai import AI
+
+    key = (strategy, mark, size)
+    if key not in worker_ais:
+
+        # the same AIs as in the game window
+        if size == 3:
+            worker_ais[key] = AI(mark, strategy, time_limit=1)
+        else:
+            worker_ais[key] = AI(mark, strategy, time_limit=1, max_depth=4)
+
+    state = GameState(x_bits, o_bits, get_geometry(size, win_length))
+    return worker_ais[key].choose_move(state)
+
+class Game:
+
+    def __init__(self, size, win_length, x_player, o_player):
+
+        # the rules are the same Board the game window uses
+        self.board = Board(size, win_length)
+
+        # the Connection playing each mark, or the AI's strategy name
+        self.players = {'X': x_player, 'O': o_player}
+        self.turn = 'X'
+        self.over = False
+
+    def connections(self):
+        return [player for player in self.players.values() if isinstance(player, Connection)]
+
+    def send_all(self, message):
+        for connection in self.connections():
+            connection.send(message)
+
+    def play(self, row, col):
+
+        # mark the square of the player whose turn it is
+        # and tell everyone about it, and about the end of the game
+        mark = self.turn
+        square = self.board.mark_square(row, col, mark)
+        self.send_all(f'MOVED {mark} {row} {col}')
+
+        if self.board.check_winner(square, mark):
+            self.send_all(f'WIN {mark}')
+            self.end()
+        elif self.board.check_tie():
+            self.send_all('TIE')
+            self.end()
+        else:
+            if mark == 'X':
+                self.turn = 'O'
+            else:
+                self.turn = 'X'
+
+    def end(self):
+        self.over = True
+        for connection in self.connections():
+            connection.game = None
+
+class Server:
+
+    def __init__(self, workers=None):
+
+        # the smart AI searches in these processes
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+        # a player waiting for an opponent, for each (size, win_length)
+        self.waiting = dict()
+
+        # the AI moves being made (the event loop only keeps weak references to tasks)
+        self.ai_tasks = set()
+
+        self.games_played = 0
+        self.active_games = 0
+
+    async def handle_client(self, reader, writer):
+
+        connection = Connection(self, writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode('ascii', 'replace').split()
+                if not words:
+                    continue
+                if words[0] == 'QUIT':
+                    break
+                connection.handle(words)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.disconnect(connection)
+            writer.close()
+
+    def disconnect(self, connection):
+
+        # stop waiting, and end the game the player was in
+        for board, waiting in list(self.waiting.items()):
+            if waiting is connection:
+                del self.waiting[board]
+
+        game = connection.game
+        if game is not None and not game.over:
+            game.end()
+            self.active_games -= 1
+            for other in game.connections():
+                if other is not connection:
+                    other.send('LEFT')
+
+    def start_game(self, size, win_length, first, second):
+
+        # randomly select who goes first
+        if random.random() < 0.5:
+            first, second = second, first
+
+        game = Game(size, win_length, first, second)
+        self.games_played += 1
+        self.active_games += 1
+        for mark, player in game.players.items():
+            if isinstance(player, Connection):
+                player.game = game
+                player.mark = mark
+                player.send(f'START {mark} {size} {win_length}')
+        self.next_turn(game)
+
+    def next_turn(self, game):
+
+        # ask the next player for a move, or let the AI move
+        if game.over:
+            self.active_games -= 1
+            return
+        player = game.players[game.turn]
+        if isinstance(player, Connection):
+            player.send('TURN')
+        else:
+            task = asyncio.create_task(self.ai_move(game, player))
+            self.ai_tasks.add(task)
+            task.add_done_callback(self.ai_tasks.discard)
+
+    async def ai_move(self, game, strategy):
+
+        state = game.board.state
+        if strategy == 'random':
+
+            # a random move doesn't need a search, so it's made right here
+            index = random.choice(list(state.available_moves()))
+
+        else:
+            loop = asyncio.get_running_loop()
+            index = await loop.run_in_executor(self.executor, choose_ai_move, strategy, game.turn, state.x_bits,
+                                               state.o_bits, game.board.size, game.board.win_length)
+
+        # the player may have left while the AI was thinking
+        if game.over:
+            return
+
+        row, col = game.board.geometry.square_position(index)
+        game.play(row, col)
+        self.next_turn(game)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+class Connection:
+
+    def __init__(self, server, writer):
+        self.server = server
+        self.writer = writer
+
+        # the game being played and the mark in it, or None
+        self.game = None
+        self.mark = None
+
+    def send(self, message):
+        self.writer.write(message.encode('ascii') + b'\n')
+
+    def handle(self, words):
+
+        command = words[0]
+        if command == 'PLAY':
+            self.play(words[1:])
+        elif command == 'MOVE':
+            self.move(words[1:])
+        else:
+            self.send(f'ERROR unknown command {command}')
+
+    def play(self, args):
+
+        if self.game is not None or self in self.server.waiting.values():
+            self.send('ERROR already playing')
+            return
+
+        try:
+            opponent = args[0]
+            if len(args) > 1:
+                size, win_length = int(args[1]), int(args[2])
+            else:
+                size, win_length = 3, 3
+        except (IndexError, ValueError):
+            self.send('ERROR usage: PLAY human|strategy [size win_length]')
+            return
+
+        # any registered strategy can be played against, with the ones from plugins
+        if opponent != 'human':
+            try:
+                get_strategy(opponent)
+            except ValueError:
+                self.send(f'ERROR unknown opponent {opponent}')
+                return
+        if not 3 <= size <= max_board_size or not 3 <= win_length <= size:
+            self.send('ERROR bad board size')
+            return
+
+        if opponent != 'human':
+            self.server.start_game(size, win_length, self, opponent)
+            return
+
+        # match up with the player waiting for the same board, or wait for one
+        waiting = self.server.waiting.pop((size, win_length), None)
+        if waiting is None:
+            self.server.waiting[(size, win_length)] = self
+            self.send('WAIT')
+        else:
+            self.server.start_game(size, win_length, waiting, self)
+
+    def move(self, args):
+
+        game = self.game
+        if game is None:
+            self.send('ERROR not playing')
+            return
+        if game.turn != self.mark:
+            self.send('ERROR not your turn')
+            return
+
+        try:
+            row, col = int(args[0]), int(args[1])
+        except (IndexError, ValueError):
+            self.send('ERROR usage: MOVE row col')
+            return
+
+        square = game.board.squares.get((row, col))
+        if square is None or square.mark is not None:
+            self.send('ERROR square not available')
+            return
+
+        game.play(row, col)
+        self.server.next_turn(game)
+
+async def serve(host='127.0.0.1', port=8765, workers=None):
+
+    server = Server(workers)
+    network_server = await asyncio.start_server(server.handle_client, host, port, backlog=4096)
+    print(f'serving on {host}:{port}')
+    try:
+        async with network_server:
+            await network_server.serve_forever()
+    finally:
+        server.close()
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Host tic tac toe games over the network.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes for the smart AI')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+# the smart AI's best move for any position, over HTTP
+#
+#   python tic_tac_toe_service.py --port 8080
+#
+#   curl -d '{"board": "X.O.X...."}' localhost:8080/move
+#   {"mark": "O", "move": 8, "row": 2, "col": 2, "score": 0, "winner": null, "winning_line": null, "cached": false}
+#
+# POST /move with a JSON object:
+#   board        the squares row by row, 'X', 'O' or '.' for an empty square
+#                (one string, or a list of one string for each row)
+#   win_length   marks in a row to win (only needed for boards bigger than 3x3)
+#   mark         the player to move (X goes first if it isn't given)
+# or {"positions": [...]} with a list of them, to get {"results": [...]} back
+#
+# the answer is the square to play (its index, row and col), the search score
+# for the player to move (win_score minus the moves to a forced win, the
+# negative of that for a forced loss, 0 for a tie or an estimate on big
+# boards) and the winner and their winning line if the game is over after the
+# move (or already was, with no move)
+#
+# nothing is kept between requests but a cache of answers: the service
+# doesn't hold any games, and the positions it's sent aren't changed
+#
+# GET /stats returns how many requests were answered from the cache, and how
+# many searches were made in how many batches
+#
+# the searches run in a pool of processes
+# positions that come in at about the same time are sent to the pool in one
+# batch, and while every worker is busy the positions keep adding up for the
+# next batch, so a busy service makes fewer, bigger batches
+# a position that's already being searched for another request isn't searched again
+#
+# the answers are cached by position, rotated or mirrored to the same
+# canonical position first, so all 8 symmetries of a position share one answer
+#
+# tic_tac_toe_loadtest.py --service sends it lots of requests
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from tic_tac_toe_engine import GameState, TranspositionTable, get_geometry
+from tic_tac_toe_core import Board
+from tic_tac_toe_ai import AI
+
+max_board_size = 15
+
+# requests bigger than this are refused
+max_body_size = 1 << 20
+
+# positions a batch can hold, and how long a batch waits for more
+max_batch_size = 64
+batch_delay = 0.002
+
+# the smart AI searches 3x3 to the end of the game (without the book, so it has a score)
+# and bigger boards a few moves ahead, for up to a second
+search_time_limit = 1
+search_max_depth = 4
+
+# the AI of each worker process for each board size, made the first time it's needed
+worker_ais = dict()
+
+def solve_positions(positions):
+
+    # runs in a worker process: return the (move, score) of every (size, win_length, mover_bits, other_bits)
+    results = []
+    for size, win_length, mover_bits, other_bits in positions:
+        if size not in worker_ais:
+            if size == 3:
+                worker_ais[size] = AI('X', 'smart', book=False, index=False)
+            else:
+                worker_ais[size] = AI('X', 'smart', book=False, index=False, time_limit=search_time_limit,
+                                      max_depth=search_max_depth)
+        ai = worker_ais[size]
+
+        # the AI plays X, so the player to move's marks are the X marks
+        move = ai.choose_move(GameState(mover_bits, other_bits, get_geometry(size, win_length)))
+
+        # the score of the deepest search that finished
+        score = None
+        for iteration in ai.iterations:
+            if iteration['completed']:
+                score = iteration['score']
+        results.append((move, score))
+    return results
+
+def canonical_position(geometry, mover_bits, other_bits):
+
+    # return (mover_bits, other_bits, mapping) of the rotation or reflection of the position
+    # with the smallest key, and the symmetry that turns the position into it
+    best = None
+    for mapping in geometry.symmetries:
+        new_mover_bits = geometry.transform_mask(mover_bits, mapping)
+        new_other_bits = geometry.transform_mask(other_bits, mapping)
+        key = (new_mover_bits << geometry.num_squares) | new_other_bits
+        if best is None or key < best[0]:
+            best = (key, new_mover_bits, new_other_bits, mapping)
+    key, mover_bits, other_bits, mapping = best
+    return mover_bits, other_bits, mapping
+
+class BadRequest(Exception):
+    pass
+
+def parse_position(request):
+
+    # return (geometry, x_bits, o_bits, mark) from a position in a request
+    # raises BadRequest if it isn't a position that can come up in a game
+    if not isinstance(request, dict):
+        raise BadRequest('a position is a JSON object')
+    board = request.get('board')
+    if isinstance(board, list) and all(isinstance(row, str) for row in board):
+        board = ''.join(board)
+    if not isinstance(board, str):
+        raise BadRequest('board must be a string or a list of strings')
+
+    size = int(len(board) ** 0.5)
+    if size * size != len(board) or not 3 <= size <= max_board_size:
+        raise BadRequest(f'board must have 9 to {max_board_size * max_board_size} squares in a square')
+    win_length = request.get('win_length', 3 if size == 3 else None)
+    if not isinstance(win_length, int) or not 3 <= win_length <= size:
+        raise BadRequest('win_length must be 3 to the board size (it has to be given for boards bigger than 3x3)')
+
+    x_bits = 0
+    o_bits = 0
+    for index, square in enumerate(board.upper()):
+        if square == 'X':
+            x_bits |= 1 << index
+        elif square == 'O':
+            o_bits |= 1 << index
+        elif square not in '.-_ ':
+            raise BadRequest(f'unknown square {square!r}')
+
+    # X goes first unless the mark is given, but the players always take turns
+    x_count = x_bits.bit_count()
+    o_count = o_bits.bit_count()
+    mark = request.get('mark')
+    if mark is None:
+        if x_count == o_count:
+            mark = 'X'
+        else:
+            mark = 'O'
+    if mark not in ('X', 'O'):
+        raise BadRequest("mark must be 'X' or 'O'")
+    if abs(x_count - o_count) > 1 or (mark == 'X' and x_count > o_count) or (mark == 'O' and o_count > x_count):
+        raise BadRequest(f'{mark} can\'t be the player to move with {x_count} Xs and {o_count} Os')
+
+    return get_geometry(size, win_length), x_bits, o_bits, mark
+
+class Batcher:
+
+    def __init__(self, executor, workers):
+        self.executor = executor
+        self.workers = workers
+
+        # positions waiting for the next batch, with the future of each one's (move, score)
+        self.pending = []
+        self.timer = None
+
+        # batches the workers are searching
+        self.running = 0
+
+        self.batches = 0
+        self.searches = 0
+
+    def solve(self, position):
+
+        # return a future of the (move, score) of a (size, win_length, mover_bits, other_bits)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((position, future))
+        if len(self.pending) >= max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(batch_delay, self.flush)
+        return future
+
+    def flush(self):
+
+        # send the waiting positions to the pool as one batch
+        # unless every worker is busy, then they wait for a batch to finish
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending or self.running >= self.workers:
+            return
+        batch = self.pending[:max_batch_size]
+        del self.pending[:max_batch_size]
+        self.running += 1
+        self.batches += 1
+        self.searches += len(batch)
+
+        loop = asyncio.get_running_loop()
+        results = loop.run_in_executor(self.executor, solve_positions, [position for position, future in batch])
+        results.add_done_callback(lambda results: self.finished(batch, results))
+
+    def finished(self, batch, results):
+
+        self.running -= 1
+        for index, (position, future) in enumerate(batch):
+            if future.cancelled():
+                continue
+            if results.exception() is not None:
+                future.set_exception(results.exception())
+            else:
+                future.set_result(results.result()[index])
+
+        # the positions that came in while the workers were busy
+        if self.pending:
+            self.flush()
+
+class Service:
+
+    def __init__(self, workers=None, cache_size=100000):
+
+        if workers is None:
+            workers = os.cpu_count()
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.batcher = Batcher(self.executor, workers)
+
+        # (move, score) of the canonical positions that were searched, least recently used first
+        # and the futures of the ones being searched
+        self.cache = TranspositionTable(max_size=cache_size)
+        self.searching = dict()
+
+        self.requests = 0
+
+    async def best_move(self, geometry, x_bits, o_bits, mark):
+
+        # the answer to one position, as a dict for the JSON
+        self.requests += 1
+        board = Board(geometry.size, geometry.win_length)
+        board.state = GameState(x_bits, o_bits, geometry)
+        answer = {'mark': mark, 'move': None, 'row': None, 'col': None, 'score': None, 'winner': None,
+                  'winning_line': None, 'cached': False}
+
+        # a game that's already over doesn't need a move
+        for winner in ('X', 'O'):
+            line = board.state.winning_line(winner)
+            if line is not None:
+                answer.update(winner=winner, winning_line=[list(position) for position in geometry.iter_squares(line)])
+                return answer
+        if board.check_tie():
+            return answer
+
+        # look the canonical position up, or search it
+        if mark == 'X':
+            mover_bits, other_bits = x_bits, o_bits
+        else:
+            mover_bits, other_bits = o_bits, x_bits
+        mover_bits, other_bits, mapping = canonical_position(geometry, mover_bits, other_bits)
+        key = (geometry.size, geometry.win_length, mover_bits, other_bits)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            answer['cached'] = True
+        else:
+            if key not in self.searching:
+                future = self.batcher.solve(key)
+                future.add_done_callback(lambda future: self.searched(key, future))
+                self.searching[key] = future
+
+            # a client that leaves doesn't stop the search, the next one asking gets its answer
+            entry = await asyncio.shield(self.searching[key])
+        move, score = entry
+
+        # turn the move back to the position that was asked about
+        # then check the move on the board the same way the game does
+        index = mapping.index(move)
+        row, col = geometry.square_position(index)
+        square = board.mark_square(row, col, mark)
+        winning_line = board.get_winning_line(square, mark)
+        answer.update(move=index, row=row, col=col, score=score)
+        if winning_line is not None:
+            answer.update(winner=mark, winning_line=[[square.row, square.col] for square in winning_line])
+        return answer
+
+    def searched(self, key, future):
+
+        # cache the answer when the search is done, even if every client asking for it left
+        del self.searching[key]
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'cache_size': len(self.cache),
+            'searches': self.batcher.searches,
+            'batches': self.batcher.batches,
+        }
+
+    async def respond(self, method, path, body):
+
+        # return (status, JSON object) for a request
+        if path == '/stats':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            return 200, self.stats()
+        if path != '/move':
+            return 404, {'error': f'nothing at {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+
+        try:
+            request = json.loads(body)
+            if isinstance(request, dict) and 'positions' in request:
+                if not isinstance(request['positions'], list):
+                    raise BadRequest('positions must be a list')
+                positions = [parse_position(position) for position in request['positions']]
+            else:
+                positions = [parse_position(request)]
+        except ValueError:
+            return 400, {'error': 'the body must be JSON'}
+        except BadRequest as error:
+            return 400, {'error': str(error)}
+
+        answers = await asyncio.gather(*[self.best_move(*position) for position in positions])
+        if 'positions' in request:
+            return 200, {'results': answers}
+        return 200, answers[0]
+
+    async def handle_client(self, reader, writer):
+
+        # HTTP/1.1 requests one after another on the connection, until either side closes it
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    self.send(writer, 400, {'error': 'bad request line'}, False)
+                    break
+
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, colon, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= max_body_size:
+                    self.send(writer, 413, {'error': 'bad content length'}, False)
+                    break
+                body = await reader.readexactly(length)
+
+                try:
+                    status, response = await self.respond(method, path.split('?')[0], body)
+                except Exception as error:
+                    status, response = 500, {'error': f'{type(error).__name__}: {error}'}
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                self.send(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def send(self, writer, status, response, keep_alive):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   413: 'Payload Too Large', 500: 'Internal Server Error'}
+        body = json.dumps(response).encode('utf-8')
+        if keep_alive:
+            connection = 'keep-alive'
+        else:
+            connection = 'close'
+        writer.write(f'HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n'.encode('latin-1') + body)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+async def serve(host='127.0.0.1', port=8080, workers=None, cache_size=100000):
+
+    service = Service(workers, cache_size)
+    network_server = await asyncio.start_server(service.handle_client, host, port, backlog=4096)
+    print(f'serving on http://{host}:{port}')
+    try:
+        async with network_server:
+            await network_server.serve_forever()
+    finally:
+        service.close()
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Answer best move requests over HTTP with the smart AI.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes to search in')
+    parser.add_argument('--cache-size', type=int, default=100000, help='answers to keep')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# play lots of AI against AI games without a window
+#
+#   python tic_tac_toe_simulate.py random smart --games 1000000
+#
+# the games are split into batches that run on a pool of processes
+# every batch gets its own seed, so the results only depend on --seed
+# (not on how many workers there are or which one ran which batch)
+# unless there's a --time-limit: a search that runs out of time stops wherever
+# it got to, so with one the counts change from run to run
+#
+# nothing here imports pygame, so the workers start quickly
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from tic_tac_toe_engine import GameState, get_geometry
+from tic_tac_toe_ai import AI
+
+def play_game(first_player, second_player, geometry, latencies=None):
+
+    # play one game on a GameState
+    # return the mark of the winner, or None if it's a tie
+    # latencies is a {mark: list} to add the seconds every move took to, or None
+    state = GameState(geometry=geometry)
+    current_player = first_player
+    other_player = second_player
+
+    while True:
+
+        if latencies is None:
+            index = current_player.choose_move(state)
+        else:
+            start_time = time.perf_counter()
+            index = current_player.choose_move(state)
+            latencies[current_player.mark].append(time.perf_counter() - start_time)
+        state.place(index, current_player.mark)
+
+        if state.is_winning_move(index, current_player.mark):
+            return current_player.mark
+        elif state.is_full():
+            return None
+
+        current_player, other_player = other_player, current_player
+
+def play_batch(seed, first_game, games, strategy_a, strategy_b, size=3, win_length=3, time_limit=None,
+               max_depth=None):
+
+    # play a batch of games between strategy_a (always X) and strategy_b (always O)
+    # and return the (wins, draws, losses) counts for strategy_a
+    rng = random.Random(seed)
+    geometry = get_geometry(size, win_length)
+    player_a = AI('X', strategy_a, time_limit=time_limit, max_depth=max_depth, rng=rng)
+    player_b = AI('O', strategy_b, time_limit=time_limit, max_depth=max_depth, rng=rng)
+
+    wins = 0
+    draws = 0
+    losses = 0
+    for game in range(first_game, first_game + games):
+
+        # take turns going first
+        if game % 2 == 0:
+            winner = play_game(player_a, player_b, geometry)
+        else:
+            winner = play_game(player_b, player_a, geometry)
+
+        if winner == 'X':
+            wins += 1
+        elif winner == 'O':
+            losses += 1
+        else:
+            draws += 1
+
+    return wins, draws, losses
+
+def run_simulation(games, strategy_a, strategy_b, workers=None, seed=0, batch_size=10000, size=3, win_length=3,
+                   time_limit=None, max_depth=None):
+
+    start_time = time.perf_counter()
+    wins = 0
+    draws = 0
+    losses = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        # split the games into batches, each with a seed made from the main seed
+        futures = []
+        for batch_number, first_game in enumerate(range(0, games, batch_size)):
+            batch_games = min(batch_size, games - first_game)
+            batch_seed = seed * 1000003 + batch_number
+            futures.append(executor.submit(play_batch, batch_seed, first_game, batch_games, strategy_a, strategy_b,
+                                           size, win_length, time_limit, max_depth))
+
+        for future in futures:
+            batch_wins, batch_draws, batch_losses = future.result()
+            wins += batch_wins
+            draws += batch_draws
+            losses += batch_losses
+
+    seconds = time.perf_counter() - start_time
+    return {
+        'strategy_a': strategy_a,
+        'strategy_b': strategy_b,
+        'games': games,
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'seconds': seconds,
+        'games_per_second': games / seconds,
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Play AI against AI games without a window.')
+    parser.add_argument('strategy_a', help="strategy of the first AI ('random', 'smart' or 'mcts')")
+    parser.add_argument('strategy_b', help='strategy of the second AI')
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0,
+                        help='the same seed gives the same results, if there is no time limit')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--win-length', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds per smart or mcts move')
+    parser.add_argument('--max-depth', type=int, default=None, help='moves the smart AI looks ahead')
+    args = parser.parse_args()
+
+    results = run_simulation(args.games, args.strategy_a, args.strategy_b, args.workers, args.seed, args.batch_size,
+                             args.size, args.win_length, args.time_limit, args.max_depth)
+
+    print(f"{results['strategy_a']} vs {results['strategy_b']}: {results['games']} games")
+    print(f"  {results['strategy_a']} wins: {results['wins']}")
+    print(f"  draws: {results['draws']}")
+    print(f"  {results['strategy_b']} wins: {results['losses']}")
+    print(f"  {results['games_per_second']:.0f} games/sec ({results['seconds']:.2f} s)")
+
+if __name__ == '__main__':
+    main()
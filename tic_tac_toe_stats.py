@@ -0,0 +1,105 @@
+# what the smart AI did for each move: nodes, depth, time, cache hits
+#
+#   stats = SearchStats()
+#   ai = AI('O', 'smart', stats=stats)
+#   ...
+#   stats.write_json_lines('moves.jsonl')
+#   stats.write_chrome_trace('trace.json')
+#
+# the trace opens in chrome://tracing or https://ui.perfetto.dev, with one bar
+# for every move and one bar under it for every depth of the search
+#
+# an AI without stats doesn't collect any of this
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger('tic_tac_toe.search')
+
+def log_move(move_stats):
+
+    # a callback for SearchStats that logs every move as one line of JSON
+    logger.info(json.dumps(move_stats))
+
+class SearchStats:
+
+    def __init__(self, callback=None):
+
+        # the stats of every move, in the order they were made
+        # each one is a dict (see AI.choose_move for what's in it)
+        self.moves = []
+
+        # called with the stats of every move as soon as it's made
+        self.callback = callback
+
+        # move times are kept relative to this, in seconds
+        self.start_time = time.perf_counter()
+
+        # moves can be recorded from the AI's background thread
+        self.lock = threading.Lock()
+
+    def record(self, move_stats):
+
+        with self.lock:
+            self.moves.append(move_stats)
+        if self.callback is not None:
+            self.callback(move_stats)
+
+    def last_move(self):
+        with self.lock:
+            if self.moves:
+                return self.moves[-1]
+            return None
+
+    def summary(self):
+
+        # totals over all the moves that were searched
+        with self.lock:
+            searched = [move for move in self.moves if move['source'] == 'search']
+        nodes = sum(move['nodes'] for move in searched)
+        seconds = sum(move['seconds'] for move in searched)
+        hits = sum(move['table_hits'] for move in searched)
+        lookups = hits + sum(move['table_misses'] for move in searched)
+        return {
+            'moves': len(self.moves),
+            'searched_moves': len(searched),
+            'nodes': nodes,
+            'seconds': seconds,
+            'nodes_per_sec': nodes / seconds if seconds else 0,
+            'average_depth': sum(move['depth'] for move in searched) / len(searched) if searched else 0,
+            'table_hit_rate': hits / lookups if lookups else 0,
+        }
+
+    def write_json_lines(self, path):
+
+        # one JSON object per move
+        with self.lock:
+            moves = list(self.moves)
+        with open(path, 'w') as log_file:
+            for move in moves:
+                log_file.write(json.dumps(move) + '\n')
+
+    def chrome_trace_events(self):
+
+        # Chrome's trace event format counts time in microseconds
+        with self.lock:
+            moves = list(self.moves)
+
+        events = []
+        for move in moves:
+            start = (move['start'] - self.start_time) * 1000000
+            args = {name: value for name, value in move.items() if name not in ('start', 'iterations')}
+            events.append({'name': f"{move['mark']} {move['source']}", 'cat': 'move', 'ph': 'X', 'ts': start,
+                           'dur': move['seconds'] * 1000000, 'pid': 1, 'tid': move['thread'], 'args': args})
+
+            for iteration in move['iterations']:
+                events.append({'name': f"depth {iteration['depth']}", 'cat': 'search', 'ph': 'X',
+                               'ts': start + iteration['start'] * 1000000, 'dur': iteration['seconds'] * 1000000,
+                               'pid': 1, 'tid': move['thread'], 'args': iteration})
+        return events
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': self.chrome_trace_events(), 'displayTimeUnit': 'ms'}, trace_file)
@@ -0,0 +1,242 @@
+# the ways the AI can choose its moves, by name
+#
+#   random   any empty square
+#   smart    the opening book, then the position index, then alpha-beta search
+#   mcts     monte carlo tree search (tic_tac_toe_mcts.py)
+#
+# every strategy is a class with a uniform interface:
+#
+#   class MyStrategy(Strategy):
+#       label = 'AI - Mine'                    the button in the menu
+#       def choose_move(self, state, deadline):
+#           return the index of the square for self.ai.mark to play
+#           (deadline is a time.perf_counter() time to be done by, or None)
+#
+# and a few hooks it can override if it needs them:
+#
+#   warm_up()              class method, called once at startup to load or
+#                          build tables before the first move needs them
+#   get_cache(geometry)    the table this player shares with the others, which
+#                          the search stats count hits and misses in
+#   game_options(size)     class method, the AI settings for a game in the window
+#   stop()                 end a move early (from another thread)
+#   ponders                set to True for the AI to search its replies while
+#                          the player decides in the game (tic_tac_toe_ponder.py)
+#
+# more strategies can come from other packages through the
+# 'tic_tac_toe.strategies' entry point group, for example in a pyproject.toml:
+#
+#   [project.entry-points.'tic_tac_toe.strategies']
+#   fast = 'my_package:FastStrategy'
+#
+# registering a name again replaces the strategy, so a compiled or cached
+# version of an engine can be swapped in at runtime
+
+import os
+import warnings
+from abc import ABC, abstractmethod
+from tic_tac_toe_engine import iter_moves, standard_geometry
+from tic_tac_toe_book import get_book
+from tic_tac_toe_index import get_index
+
+entry_point_group = 'tic_tac_toe.strategies'
+
+# name -> Strategy class, in the order they show up in the menu
+strategies = dict()
+
+def register(name, strategy=None):
+
+    # register a Strategy class under a name
+    # works as a decorator too: @register('name')
+    if strategy is None:
+        return lambda strategy: register(name, strategy)
+    strategy.name = name
+    strategies[name] = strategy
+    return strategy
+
+# the entry points are only looked at once
+plugins_loaded = False
+
+def load_plugins():
+
+    # register the strategies of every installed package that has some
+    # a package that fails to load is skipped with a warning
+    global plugins_loaded
+    if plugins_loaded:
+        return
+    plugins_loaded = True
+
+    # importlib.metadata is slow to import, so it's only imported the first time
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=entry_point_group):
+        try:
+            register(entry_point.name, entry_point.load())
+        except Exception as error:
+            warnings.warn(f'could not load strategy {entry_point.name}: {error}')
+
+def get_strategy(name):
+
+    # raises ValueError if there's no strategy with that name
+    load_plugins()
+    if name not in strategies:
+        raise ValueError(f'unknown strategy {name}')
+    return strategies[name]
+
+def get_strategies():
+
+    # {name: Strategy class} of every strategy
+    load_plugins()
+    return strategies
+
+def warm_up_strategies():
+
+    # let every strategy load its tables before the first game
+    for strategy in get_strategies().values():
+        strategy.warm_up()
+
+class Strategy(ABC):
+
+    # set by register()
+    name = None
+
+    label = None
+    ponders = False
+
+    def __init__(self, ai):
+
+        # the AI this strategy chooses moves for (its mark, rng, settings and counters)
+        self.ai = ai
+
+    @classmethod
+    def warm_up(cls):
+        pass
+
+    @classmethod
+    def game_options(cls, size):
+        return dict()
+
+    def get_cache(self, geometry):
+        return None
+
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def choose_move(self, state, deadline):
+        pass
+
+@register('random')
+class RandomStrategy(Strategy):
+
+    label = 'AI - Random'
+
+    def choose_move(self, state, deadline):
+
+        # randomly select a square from the board
+        self.ai.source = 'random'
+        return self.ai.rng.choice(list(iter_moves(state.get_empty())))
+
+@register('smart')
+class SmartStrategy(Strategy):
+
+    label = 'AI - Smart'
+
+    # on big boards a search takes all the time it's given, so it's worth starting early
+    ponders = True
+
+    @classmethod
+    def warm_up(cls):
+
+        # map the opening book into memory, or load the position index if there's no book
+        if get_book() is None:
+            get_index()
+
+    @classmethod
+    def game_options(cls, size):
+
+        # the whole game can only be searched on 3x3
+        # bigger boards look a few moves ahead and estimate the rest, on every core
+        if size == 3:
+            return {'time_limit': 1}
+        return {'time_limit': 1, 'max_depth': 4, 'workers': os.cpu_count()}
+
+    def get_cache(self, geometry):
+
+        # all AIs share one transposition table for each board size (and evaluate function)
+        # unless they have their own
+        if self.ai.own_table is not None:
+            return self.ai.own_table
+        return self.ai.shared_table(geometry)
+
+    def choose_move(self, state, deadline):
+
+        ai = self.ai
+
+        # the search works on the bitboards, not on the squares
+        ai_bits = state.get_bits(ai.mark)
+        if ai.mark == 'X':
+            player_bits = state.get_bits('O')
+        else:
+            player_bits = state.get_bits('X')
+
+        # look the position up in the opening book first (it only has 3x3 positions)
+        if ai.book is not None and state.geometry is ai.book.geometry:
+            entry = ai.book.lookup(ai_bits, player_bits)
+            if entry is not None:
+                best_move, outcome = entry
+                ai.source = 'book'
+                return best_move
+
+        # then in the position index
+        if ai.book is None and ai.index is not False and state.geometry is standard_geometry:
+            if ai.index is None:
+                ai.index = get_index()
+            best_move = ai.index.best_move(ai_bits, player_bits)
+            if best_move is not None:
+                ai.source = 'index'
+                return best_move
+
+        # search for the best move
+        ai.source = 'search'
+        return ai.find_best_move(ai_bits, player_bits, deadline)
+
+@register('mcts')
+class MCTSStrategy(Strategy):
+
+    label = 'AI - MCTS'
+
+    def __init__(self, ai):
+        super().__init__(ai)
+
+        # the MCTS module (and its process pools) is only imported once it's chosen,
+        # so importing the AI stays quick for the tools that start lots of processes
+        from tic_tac_toe_mcts import MCTS
+
+        # the tree is kept from one move to the next
+        self.mcts = MCTS(ai.playouts, ai.workers, ai.rng)
+
+    @classmethod
+    def warm_up(cls):
+
+        # start the worker processes now, so the first move doesn't wait for them
+        from tic_tac_toe_mcts import start_workers
+        workers = os.cpu_count()
+        if workers > 1:
+            start_workers(workers - 1)
+
+    @classmethod
+    def game_options(cls, size):
+
+        # random playouts for a second on every core, on any board size
+        return {'time_limit': 1, 'workers': os.cpu_count()}
+
+    def stop(self):
+        self.mcts.stop()
+
+    def choose_move(self, state, deadline):
+
+        # the playouts are counted as the nodes
+        self.ai.source = 'mcts'
+        best_move = self.mcts.choose_move(state, self.ai.mark, deadline)
+        self.ai.nodes = self.mcts.playouts
+        return best_move
@@ -0,0 +1,348 @@
+# play strategies against each other without a window and rate them
+#
+#   python tic_tac_toe_tournament.py random smart mcts
+#   python tic_tac_toe_tournament.py mcts random smart --gauntlet --size 4 --win-length 4 --time-limit 0.1
+#
+# every strategy plays every other one (round robin), or with --gauntlet the
+# first strategy plays each of the others
+# the games of a pairing are played in pairs, once with each strategy going
+# first, so neither gets more first moves than the other
+#
+# after every batch of games a pairing gets a sequential probability ratio
+# test (SPRT): is the first strategy at least --elo1 stronger than the second,
+# or no more than --elo0 stronger? it stops as soon as the games played can
+# tell (with error rates --alpha and --beta), or after --max-games
+# so lopsided pairings only take a few games and close ones get more
+#
+# the report has the Elo difference of every pairing with a 95% confidence
+# interval, a rating for every strategy, and how long each one took per move
+#
+# the batches run on a pool of processes, every core by default, each with its
+# own seed (so without a time limit the results only depend on --seed)
+# every AI gets its own transposition table for each batch for the same reason
+
+import argparse
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from tic_tac_toe_engine import TranspositionTable, get_geometry
+from tic_tac_toe_ai import AI
+from tic_tac_toe_simulate import play_game
+from tic_tac_toe_strategies import get_strategy
+
+# 95% confidence intervals
+z_score = 1.96
+
+# the SPRT treats the score of a pair of games as normally distributed
+# a pairing where every pair so far had the same score would have no variance
+# and be decided by the first pair, so the variance is never taken to be lower than this
+min_variance = 0.01
+
+def expected_score(elo):
+
+    # the score (1 a win, 0.5 a tie, 0 a loss) of a player elo points stronger than the other
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def elo_from_score(score):
+
+    # the Elo difference that gives that expected score (infinite for 0 or 1)
+    if score <= 0:
+        return -math.inf
+    elif score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+def mean_and_variance(scores):
+    mean = sum(scores) / len(scores)
+    return mean, sum((score - mean) ** 2 for score in scores) / len(scores)
+
+def elo_interval(pair_scores):
+
+    # (elo, low, high) for the first strategy of a pairing, from the score of every pair of games
+    # the pairs are counted rather than the games, because the two games of a pair aren't independent
+    mean, variance = mean_and_variance(pair_scores)
+    error = z_score * math.sqrt(variance / len(pair_scores))
+    return elo_from_score(mean), elo_from_score(mean - error), elo_from_score(mean + error)
+
+def sprt_llr(pair_scores, elo0, elo1):
+
+    # the log likelihood ratio of elo1 against elo0, with the pair scores normally distributed
+    mean, variance = mean_and_variance(pair_scores)
+    variance = max(variance, min_variance)
+    score0 = expected_score(elo0)
+    score1 = expected_score(elo1)
+    return len(pair_scores) * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+def sprt_bounds(alpha, beta):
+
+    # the test stops when the ratio goes below the first bound (elo0) or above the second (elo1)
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def play_games(seed, strategy_a, strategy_b, pairs, size=3, win_length=3, time_limit=None, max_depth=None,
+               playouts=None):
+
+    # play pairs of games between strategy_a (X) and strategy_b (O), a going first in one game of each pair
+    # and b in the other
+    # return (the score of each pair for a, seconds of a's moves, seconds of b's moves)
+    rng = random.Random(seed)
+    geometry = get_geometry(size, win_length)
+    player_a = AI('X', strategy_a, table=TranspositionTable(), time_limit=time_limit, max_depth=max_depth, rng=rng,
+                  playouts=playouts)
+    player_b = AI('O', strategy_b, table=TranspositionTable(), time_limit=time_limit, max_depth=max_depth, rng=rng,
+                  playouts=playouts)
+
+    latencies = {'X': [], 'O': []}
+    pair_scores = []
+    for pair in range(pairs):
+        score = 0
+        for winner in (play_game(player_a, player_b, geometry, latencies),
+                       play_game(player_b, player_a, geometry, latencies)):
+            if winner == 'X':
+                score += 1
+            elif winner is None:
+                score += 0.5
+        pair_scores.append(score / 2)
+
+    return pair_scores, latencies['X'], latencies['O']
+
+class Pairing:
+
+    def __init__(self, number, strategy_a, strategy_b):
+        self.number = number
+        self.strategy_a = strategy_a
+        self.strategy_b = strategy_b
+
+        # the score of every pair of games for strategy_a
+        self.pair_scores = []
+
+        # batches sent to the workers, and the results that came back before an earlier batch's did
+        # (the results are counted in batch order, so the test stops at the same game every time)
+        self.batches = 0
+        self.waiting = dict()
+
+        # None while it's being played, then 'elo1', 'elo0' or 'max games'
+        self.result = None
+        self.llr = 0
+
+    @property
+    def games(self):
+        return len(self.pair_scores) * 2
+
+def make_pairings(strategies, gauntlet=False):
+
+    # every strategy against every other one, or the first one against each of the others
+    if gauntlet:
+        pairs = [(strategies[0], strategy) for strategy in strategies[1:]]
+    else:
+        pairs = [(strategies[i], strategies[j]) for i in range(len(strategies)) for j in range(i + 1, len(strategies))]
+    return [Pairing(number, strategy_a, strategy_b) for number, (strategy_a, strategy_b) in enumerate(pairs)]
+
+def fit_ratings(strategies, pairings, iterations=1000):
+
+    # a rating for every strategy that fits the scores of all the pairings (a Bradley-Terry model)
+    # each pairing counts one extra tie, so a strategy that won every game still gets a finite rating
+    # the ratings are Elo points, with an average of 0
+    strengths = {strategy: 1.0 for strategy in strategies}
+    scores = {strategy: 0.0 for strategy in strategies}
+    for pairing in pairings:
+        score = sum(pairing.pair_scores) * 2 + 0.5
+        scores[pairing.strategy_a] += score
+        scores[pairing.strategy_b] += pairing.games + 1 - score
+
+    for iteration in range(iterations):
+        new_strengths = dict()
+        for strategy in strategies:
+            total = 0
+            for pairing in pairings:
+                if strategy in (pairing.strategy_a, pairing.strategy_b):
+                    total += (pairing.games + 1) / (strengths[pairing.strategy_a] + strengths[pairing.strategy_b])
+            if total:
+                new_strengths[strategy] = scores[strategy] / total
+            else:
+                new_strengths[strategy] = strengths[strategy]
+        strengths = new_strengths
+
+    ratings = {strategy: 400 * math.log10(strength) for strategy, strength in strengths.items()}
+    average = sum(ratings.values()) / len(ratings)
+    return {strategy: rating - average for strategy, rating in ratings.items()}
+
+def latency_stats(seconds):
+
+    # how long the moves took, in milliseconds
+    if not seconds:
+        return {'moves': 0, 'mean_ms': 0, 'p95_ms': 0, 'max_ms': 0}
+    seconds = sorted(seconds)
+    return {
+        'moves': len(seconds),
+        'mean_ms': sum(seconds) / len(seconds) * 1000,
+        'p95_ms': seconds[min(len(seconds) - 1, len(seconds) * 95 // 100)] * 1000,
+        'max_ms': seconds[-1] * 1000,
+    }
+
+def run_tournament(strategies, gauntlet=False, max_games=1000, min_games=20, pairs_per_batch=5, elo0=0, elo1=50,
+                   alpha=0.05, beta=0.05, workers=None, seed=0, size=3, win_length=3, time_limit=None,
+                   max_depth=None, playouts=None):
+
+    # raises ValueError for a strategy that doesn't exist
+    for strategy in strategies:
+        get_strategy(strategy)
+    if workers is None:
+        workers = os.cpu_count()
+
+    start_time = time.perf_counter()
+    pairings = make_pairings(strategies, gauntlet)
+    lower_bound, upper_bound = sprt_bounds(alpha, beta)
+    max_batches = max(1, math.ceil(max_games / (pairs_per_batch * 2)))
+    latencies = {strategy: [] for strategy in strategies}
+
+    def count_batch(pairing, result):
+
+        # add a batch's games to its pairing, then see if the test can stop
+        pair_scores, seconds_a, seconds_b = result
+        pairing.pair_scores.extend(pair_scores)
+        latencies[pairing.strategy_a].extend(seconds_a)
+        latencies[pairing.strategy_b].extend(seconds_b)
+
+        pairing.llr = sprt_llr(pairing.pair_scores, elo0, elo1)
+        if pairing.games >= min_games and pairing.llr >= upper_bound:
+            pairing.result = 'elo1'
+        elif pairing.games >= min_games and pairing.llr <= lower_bound:
+            pairing.result = 'elo0'
+        elif pairing.games >= max_batches * pairs_per_batch * 2:
+            pairing.result = 'max games'
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        # only a couple of batches for each worker are sent at a time
+        # so a pairing that's decided doesn't leave lots of games to be played for nothing
+        futures = dict()
+        while True:
+            playing = [pairing for pairing in pairings if pairing.result is None]
+            if not playing:
+                break
+
+            # share the free workers out between the pairings still being played
+            sent = True
+            while len(futures) < workers * 2 and sent:
+                sent = False
+                for pairing in playing:
+                    if len(futures) < workers * 2 and pairing.batches < max_batches:
+                        batch_seed = (seed * 1000003 + pairing.number) * 1000003 + pairing.batches
+                        future = executor.submit(play_games, batch_seed, pairing.strategy_a, pairing.strategy_b,
+                                                 pairs_per_batch, size, win_length, time_limit, max_depth, playouts)
+                        futures[future] = (pairing, pairing.batches)
+                        pairing.batches += 1
+                        sent = True
+
+            done, not_done = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                pairing, batch = futures.pop(future)
+                if pairing.result is not None:
+                    continue
+                pairing.waiting[batch] = future.result()
+
+                # count the batches that are next in order
+                while pairing.result is None and pairing.games // (pairs_per_batch * 2) in pairing.waiting:
+                    count_batch(pairing, pairing.waiting.pop(pairing.games // (pairs_per_batch * 2)))
+
+                # drop the rest of a pairing's batches once it's decided
+                if pairing.result is not None:
+                    pairing.waiting.clear()
+                    for other_future, (other_pairing, other_batch) in list(futures.items()):
+                        if other_pairing is pairing and other_future.cancel():
+                            del futures[other_future]
+
+    seconds = time.perf_counter() - start_time
+    ratings = fit_ratings(strategies, pairings)
+
+    pairing_results = []
+    for pairing in pairings:
+        elo, low, high = elo_interval(pairing.pair_scores)
+        pairing_results.append({
+            'strategy_a': pairing.strategy_a,
+            'strategy_b': pairing.strategy_b,
+            'games': pairing.games,
+            'score': sum(pairing.pair_scores) / len(pairing.pair_scores),
+            'elo': elo,
+            'elo_low': low,
+            'elo_high': high,
+            'llr': pairing.llr,
+            'result': pairing.result,
+        })
+
+    strategy_results = []
+    for strategy in sorted(strategies, key=lambda strategy: -ratings[strategy]):
+        games = sum(pairing.games for pairing in pairings if strategy in (pairing.strategy_a, pairing.strategy_b))
+        strategy_results.append({'strategy': strategy, 'rating': ratings[strategy], 'games': games,
+                                 **latency_stats(latencies[strategy])})
+
+    return {
+        'pairings': pairing_results,
+        'strategies': strategy_results,
+        'games': sum(pairing.games for pairing in pairings),
+        'seconds': seconds,
+        'sprt': {'elo0': elo0, 'elo1': elo1, 'alpha': alpha, 'beta': beta},
+    }
+
+def format_elo(elo):
+    if math.isinf(elo):
+        if elo > 0:
+            return '+inf'
+        return '-inf'
+    return f'{round(elo):+d}'
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Play strategies against each other and rate them.')
+    parser.add_argument('strategies', nargs='+', help="two or more strategies ('random', 'smart', 'mcts' ...)")
+    parser.add_argument('--gauntlet', action='store_true', help='the first strategy plays each of the others')
+    parser.add_argument('--max-games', type=int, default=1000, help='games for each pairing at most')
+    parser.add_argument('--min-games', type=int, default=20, help='games for each pairing at least')
+    parser.add_argument('--pairs-per-batch', type=int, default=5, help='pairs of games a worker plays at a time')
+    parser.add_argument('--elo0', type=float, default=0)
+    parser.add_argument('--elo1', type=float, default=50)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--win-length', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds per smart or mcts move')
+    parser.add_argument('--max-depth', type=int, default=None, help='moves the smart AI looks ahead')
+    parser.add_argument('--playouts', type=int, default=None, help='playouts per mcts move')
+    args = parser.parse_args()
+
+    if len(args.strategies) < 2:
+        parser.error('a tournament needs at least two strategies')
+    try:
+        results = run_tournament(args.strategies, args.gauntlet, args.max_games, args.min_games, args.pairs_per_batch,
+                                 args.elo0, args.elo1, args.alpha, args.beta, args.workers, args.seed, args.size,
+                                 args.win_length, args.time_limit, args.max_depth, args.playouts)
+    except ValueError as error:
+        parser.error(str(error))
+
+    sprt = results['sprt']
+    print(f"{results['games']} games in {results['seconds']:.2f} s")
+    print(f"SPRT elo0 {sprt['elo0']:g} elo1 {sprt['elo1']:g} alpha {sprt['alpha']:g} beta {sprt['beta']:g}")
+    print()
+    print(f"{'pairing':<28} {'games':>6} {'score':>7}  {'elo (95% interval)':<24} result")
+    for pairing in results['pairings']:
+        name = f"{pairing['strategy_a']} vs {pairing['strategy_b']}"
+        interval = f"{format_elo(pairing['elo'])} ({format_elo(pairing['elo_low'])}, {format_elo(pairing['elo_high'])})"
+        if pairing['result'] == 'elo1':
+            result = f"{pairing['strategy_a']} is stronger"
+        elif pairing['result'] == 'elo0':
+            result = f"{pairing['strategy_a']} is no stronger"
+        else:
+            result = f"undecided (llr {pairing['llr']:.2f})"
+        print(f"{name:<28} {pairing['games']:>6} {pairing['score']:>7.1%}  {interval:<24} {result}")
+    print()
+    print(f"{'strategy':<12} {'rating':>7} {'games':>6} {'moves':>7} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for strategy in results['strategies']:
+        print(f"{strategy['strategy']:<12} {strategy['rating']:>+7.0f} {strategy['games']:>6} {strategy['moves']:>7} "
+              f"{strategy['mean_ms']:>9.2f} {strategy['p95_ms']:>9.2f} {strategy['max_ms']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+# ultimate tic tac toe: nine 3x3 boards in a 3x3 grid
+#
+# winning a small board puts your mark on that square of the big board, and
+# three small boards in a row wins the game
+# the square you play in a small board sends the other player to the small
+# board in the same place on the big board; if that board is already won or
+# full, they can play in any board that isn't
+#
+# a position is one integer per player, like the normal game, with the small
+# boards one after the other so each one is 9 bits of it:
+#
+#   bit number = board * 9 + square      (both numbered like a 3x3 board)
+#
+# so the normal 3x3 win check works on a small board (its 9 bits) and on the
+# big board (a 9 bit mask of the small boards a player has won)
+# what's won is kept up to date as the moves are made: a move only checks the
+# small board it was played in, and the big board if it won that one
+#
+#   state = UltimateState()
+#   state.place(40, 'X')             # the middle of the middle board
+#   state.legal_moves()              # bitmask of the squares O can play now
+#   UltimateAI('O').choose_move(state)
+#
+# nothing here uses pygame, tic_tac_toe_part2.py draws the board
+
+import random
+import time
+from tic_tac_toe_engine import iter_moves, standard_geometry
+from tic_tac_toe_core import Square, Squares
+from tic_tac_toe_mcts import Node, other_mark, win, tie, loss
+
+num_squares = 81
+full_board = (1 << num_squares) - 1
+
+# the squares of each small board
+board_masks = [0b111111111 << (board * 9) for board in range(9)]
+
+def square_board(index):
+
+    # return the small board a square is in, and the square in that board
+    return divmod(index, 9)
+
+class UltimateState:
+
+    # no __dict__, so a position is only a few ints
+    __slots__ = ('x_bits', 'o_bits', 'x_boards', 'o_boards', 'full_boards', 'active', 'winner')
+
+    def __init__(self):
+
+        # the marks on the 81 squares
+        self.x_bits = 0
+        self.o_bits = 0
+
+        # the small boards won by each player and the ones that are full without a winner
+        # (9 bit masks, like the marks on a 3x3 board)
+        self.x_boards = 0
+        self.o_boards = 0
+        self.full_boards = 0
+
+        # the small board the next move has to be played in, or None for any open one
+        self.active = None
+
+        # 'X' or 'O' once three small boards in a row are won
+        self.winner = None
+
+    def get_bits(self, mark):
+        if mark == 'X':
+            return self.x_bits
+        else:
+            return self.o_bits
+
+    def get_boards(self, mark):
+        if mark == 'X':
+            return self.x_boards
+        else:
+            return self.o_boards
+
+    def get_mark(self, index):
+
+        # return the mark on a square, or None if it's empty
+        bit = 1 << index
+        if self.x_bits & bit:
+            return 'X'
+        elif self.o_bits & bit:
+            return 'O'
+        else:
+            return None
+
+    def closed_boards(self):
+
+        # the small boards that are won or full
+        return self.x_boards | self.o_boards | self.full_boards
+
+    def place(self, index, mark):
+
+        # play a move (it has to be one of legal_moves())
+        board, square = square_board(index)
+        shift = board * 9
+        if mark == 'X':
+            self.x_bits |= 1 << index
+            bits = self.x_bits
+        else:
+            self.o_bits |= 1 << index
+            bits = self.o_bits
+
+        # only the small board the move was played in can change
+        if standard_geometry.is_winning_move((bits >> shift) & 0b111111111, square):
+            if mark == 'X':
+                self.x_boards |= 1 << board
+                boards = self.x_boards
+            else:
+                self.o_boards |= 1 << board
+                boards = self.o_boards
+
+            # and then the big board
+            if standard_geometry.is_winning_move(boards, board):
+                self.winner = mark
+        elif (self.x_bits | self.o_bits) & board_masks[board] == board_masks[board]:
+            self.full_boards |= 1 << board
+
+        # send the other player to the small board in the same place as the square
+        if self.closed_boards() & (1 << square):
+            self.active = None
+        else:
+            self.active = square
+
+    def is_over(self):
+        return self.winner is not None or self.closed_boards() == standard_geometry.full_board
+
+    def legal_moves(self):
+
+        # bitmask of the squares the next move can be played in
+        if self.is_over():
+            return 0
+        if self.active is not None:
+            open_squares = board_masks[self.active]
+        else:
+            open_squares = 0
+            for board in iter_moves(standard_geometry.full_board & ~self.closed_boards()):
+                open_squares |= board_masks[board]
+        return open_squares & ~(self.x_bits | self.o_bits)
+
+    def copy(self):
+        state = UltimateState.__new__(UltimateState)
+        state.x_bits = self.x_bits
+        state.o_bits = self.o_bits
+        state.x_boards = self.x_boards
+        state.o_boards = self.o_boards
+        state.full_boards = self.full_boards
+        state.active = self.active
+        state.winner = self.winner
+        return state
+
+    def encode(self):
+
+        # the whole position as one int: the marks and the small board that's next (9 for any)
+        # what's won can be worked out from the marks, so it isn't part of it
+        if self.active is None:
+            active = 9
+        else:
+            active = self.active
+        return self.x_bits | (self.o_bits << num_squares) | (active << (2 * num_squares))
+
+def decode(key):
+
+    # the UltimateState that encode() returned key for
+    state = UltimateState()
+    state.x_bits = key & full_board
+    state.o_bits = (key >> num_squares) & full_board
+    for board in range(9):
+        shift = board * 9
+        x_bits = (state.x_bits >> shift) & 0b111111111
+        o_bits = (state.o_bits >> shift) & 0b111111111
+        if standard_geometry.find_winning_line(x_bits) is not None:
+            state.x_boards |= 1 << board
+        elif standard_geometry.find_winning_line(o_bits) is not None:
+            state.o_boards |= 1 << board
+        elif x_bits | o_bits == standard_geometry.full_board:
+            state.full_boards |= 1 << board
+    for mark in ('X', 'O'):
+        if standard_geometry.find_winning_line(state.get_boards(mark)) is not None:
+            state.winner = mark
+    active = key >> (2 * num_squares)
+    if active != 9:
+        state.active = active
+    return state
+
+# the board is drawn as a 9x9 grid of squares with a gap between the small boards
+cell_size = 46
+small_board_length = cell_size * 3
+gap = 12
+board_length = small_board_length * 3 + gap * 2
+
+class NestedGeometry:
+
+    # rows and cols of the 9x9 grid the way the squares of the window are laid out
+    # so the squares of the game (tic_tac_toe_core.Square) work on this board too
+    size = 9
+    num_squares = num_squares
+    full_board = full_board
+
+    def square_index(self, row, col):
+        board = (row // 3) * 3 + col // 3
+        square = (row % 3) * 3 + col % 3
+        return board * 9 + square
+
+    def square_position(self, index):
+
+        # returns a (row, col) tuple
+        board, square = square_board(index)
+        return (board // 3) * 3 + square // 3, (board % 3) * 3 + square % 3
+
+    def iter_squares(self, mask):
+        for index in iter_moves(mask):
+            yield self.square_position(index)
+
+nested_geometry = NestedGeometry()
+
+class UltimateBoard:
+
+    __slots__ = ('state', 'winning_boards', 'changed_boards', 'redraw_all')
+
+    geometry = nested_geometry
+    square_class = Square
+
+    # the sizes the game screen reads off every board
+    size = 9
+    win_length = 3
+    window_size = (board_length, board_length)
+
+    def __init__(self):
+        self.create_new_board()
+
+    def create_new_board(self):
+
+        self.state = UltimateState()
+
+        # the small boards in the winning line, for highlighting them (a 9 bit mask)
+        self.winning_boards = 0
+
+        # the small boards that changed since the board was last drawn (a 9 bit mask)
+        # a move changes the board it's played in and the ones it highlights or stops highlighting
+        self.changed_boards = 0
+        self.redraw_all = True
+
+    @property
+    def squares(self):
+        return Squares(self)
+
+    def board_rect(self, board):
+
+        # (x, y, width, height) of a small board in the window
+        x = (board % 3) * (small_board_length + gap)
+        y = (board // 3) * (small_board_length + gap)
+        return (x, y, small_board_length, small_board_length)
+
+    def highlighted_boards(self):
+
+        # the small boards the next move can be played in
+        state = self.state
+        if state.is_over():
+            return 0
+        if state.active is not None:
+            return 1 << state.active
+        return standard_geometry.full_board & ~state.closed_boards()
+
+    def square_at(self, click_pos):
+
+        # return the square at a position in the window
+        # or None if it's in a gap or in a small board that can't be played in
+        click_x, click_y = click_pos
+        board_col, x = divmod(click_x, small_board_length + gap)
+        board_row, y = divmod(click_y, small_board_length + gap)
+        if not (0 <= board_row < 3 and 0 <= board_col < 3) or x >= small_board_length or y >= small_board_length:
+            return None
+        if not self.highlighted_boards() & (1 << (board_row * 3 + board_col)):
+            return None
+        return self.square_class(self, board_row * 3 + y // cell_size, board_col * 3 + x // cell_size)
+
+    def mark_square(self, row, col, mark):
+
+        # mark the square and return a view of it
+        index = self.geometry.square_index(row, col)
+        highlighted = self.highlighted_boards()
+        self.state.place(index, mark)
+        self.changed_boards |= (1 << (index // 9)) | highlighted ^ self.highlighted_boards()
+        return self.square_class(self, row, col)
+
+    def get_winning_line(self, square, mark):
+
+        # return the small boards that won the game (a bitmask) if the move won it, or None
+        if self.state.winner != mark:
+            return None
+        return standard_geometry.find_winning_line(self.state.get_boards(mark))
+
+    def record_win(self, winning_boards):
+        self.winning_boards = winning_boards
+        self.changed_boards |= winning_boards
+
+    def check_tie(self):
+
+        # every small board is won or full and nobody has three in a row
+        return self.state.is_over() and self.state.winner is None
+
+class UltimateAI:
+
+    # monte carlo tree search (like tic_tac_toe_mcts.py) on the ultimate board
+    # there are far too many positions to search to the end, so it plays random games
+    # for as long as it's given and returns the move it tried the most
+    def __init__(self, mark, time_limit=1, max_playouts=None, rng=None):
+        self.mark = mark
+
+        # seconds for each move, and playouts for each move (None for no limit)
+        # it stops at whichever comes first
+        self.time_limit = time_limit
+        self.max_playouts = max_playouts
+
+        if rng is None:
+            rng = random.Random()
+        self.rng = rng
+
+        # playouts done for the last move, for the title when the game is run with --debug
+        self.nodes = 0
+        self.stats = None
+
+        # set by stop() from another thread to end a move early
+        self.stop_requested = False
+
+    def stop(self):
+        self.stop_requested = True
+
+    def choose_move(self, state):
+
+        # return the index of the square to play in an UltimateState, without changing it
+        # or None if the game is over
+        self.stop_requested = False
+        moves = state.legal_moves()
+        if not moves:
+            return None
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.perf_counter() + self.time_limit
+
+        root = Node(None, None, moves, None)
+        self.nodes = 0
+        while self.max_playouts is None or self.nodes < self.max_playouts:
+            if self.stop_requested:
+                break
+            if deadline is not None and self.nodes % 16 == 0 and time.perf_counter() > deadline:
+                break
+            self.playout(root, state)
+            self.nodes += 1
+
+        # the move tried the most, the lowest square if there's a tie
+        # (or the first legal square if there was no time to try any)
+        if not root.children:
+            return next(iter_moves(moves))
+        return min(root.children, key=lambda child: (-child.visits, child.move)).move
+
+    def playout(self, root, root_state):
+
+        state = root_state.copy()
+        mark = self.mark
+
+        # go down the tree to a node with moves that haven't been tried
+        node = root
+        while not node.untried and node.children and node.result is None:
+            node = node.select_child()
+            state.place(node.move, mark)
+            mark = other_mark(mark)
+
+        # try one of them
+        if node.result is None and node.untried:
+            moves = list(iter_moves(node.untried))
+            index = moves[self.rng.randrange(len(moves))]
+            node.untried &= ~(1 << index)
+            state.place(index, mark)
+            if state.winner is not None:
+                child = Node(index, node, 0, win)
+            elif state.is_over():
+                child = Node(index, node, 0, tie)
+            else:
+                child = Node(index, node, state.legal_moves(), None)
+            node.children.append(child)
+            node = child
+            mark = other_mark(mark)
+
+        # play the rest of the game randomly
+        # value is what the game was worth to the player who made the move into node
+        if node.result is not None:
+            value = node.result
+        else:
+            value = random_game(state, mark, self.rng)
+
+        # and count it in every node on the way back up, for the player who moved into each one
+        while node is not None:
+            node.visits += 1
+            node.wins += value
+            value = 1.0 - value
+            node = node.parent
+
+def random_game(state, mark, rng):
+
+    # play random moves to the end of the game, mark moving first (this changes state)
+    # return what the game was worth to the other player (win, tie or loss)
+    first_mark = mark
+    while True:
+        moves = list(iter_moves(state.legal_moves()))
+        if not moves:
+            break
+        state.place(moves[rng.randrange(len(moves))], mark)
+        mark = other_mark(mark)
+    if state.winner is None:
+        return tie
+    elif state.winner == first_mark:
+        return loss
+    else:
+        return win